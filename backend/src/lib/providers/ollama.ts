@@ -28,9 +28,13 @@ export interface GenerateOptions {
   stream?: boolean;
 }
 
+// How long the installed-model list is reused before asking Ollama again
+const MODELS_TTL_MS = 30_000;
+
 export class OllamaProvider {
   private client: Ollama;
   private host: string;
+  private modelsCache?: { names: string[]; fetchedAt: number };
 
   constructor(host: string = OLLAMA_HOST) {
     this.host = host;
@@ -104,12 +108,17 @@ export class OllamaProvider {
   }
 
   /**
-   * List available models
+   * List available models (cached for MODELS_TTL_MS; failures are not cached)
    */
   async listModels(): Promise<string[]> {
+    if (this.modelsCache && Date.now() - this.modelsCache.fetchedAt < MODELS_TTL_MS) {
+      return this.modelsCache.names;
+    }
     try {
       const response = await this.client.list();
-      return response.models.map((m: any) => m.name);
+      const names = response.models.map((m: any) => m.name);
+      this.modelsCache = { names, fetchedAt: Date.now() };
+      return names;
     } catch (error) {
       console.error('[Ollama] Error listing models:', error);
       return [];
@@ -132,6 +141,7 @@ export class OllamaProvider {
     
     try {
       await this.client.pull({ model: modelName, stream: false });
+      this.modelsCache = undefined;
       console.log(`[Ollama] Model ${modelName} pulled successfully`);
     } catch (error) {
       console.error(`[Ollama] Error pulling model ${modelName}:`, error);
@@ -144,7 +154,8 @@ export class OllamaProvider {
    */
   async checkConnection(): Promise<boolean> {
     try {
-      await this.listModels();
+      // Live request: the cached model list says nothing about Ollama being up now
+      await this.client.list();
       return true;
     } catch (error) {
       console.error('[Ollama] Connection check failed:', error);
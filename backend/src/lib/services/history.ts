@@ -207,7 +207,8 @@ export class HistoryService {
    */
   private async saveHistory(history: ProjectHistoryEntry[]): Promise<void> {
     try {
-      await fs.writeFile(this.historyFile, JSON.stringify(history, null, 2));
+      // Compact: the whole file is rewritten on every update and entries carry logs
+      await fs.writeFile(this.historyFile, JSON.stringify(history));
     } catch (error) {
       console.error('[History] Failed to save history:', error);
       throw error;
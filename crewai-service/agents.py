@@ -1,11 +1,34 @@
-import json
+import asyncio
+import atexit
+import collections
+import contextlib
+import functools
+import hashlib
+import logging
 import os
-import subprocess
-import tempfile
+import queue
+import re
 import shutil
-from typing import List, Dict, Any, TypedDict, Callable
+import signal
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, TypedDict, Callable, Optional
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.language_models import BaseChatModel
+from llm_cache import LLMCache, get_llm_cache
+from llm_metrics import get_llm_metrics
+from prompt_budget import tok_head
+
+try:
+    import orjson as _json
+except ImportError:  # optional speed-up; the stdlib parser takes the same bytes
+    import json as _json
+
+logger = logging.getLogger(__name__)
+
 
 # Define States (TypedDict for LangGraph)
 class ProductManagerState(TypedDict):
@@ -32,28 +55,353 @@ class QAEngineerState(TypedDict):
     code_files: List[Dict[str, str]]
     test_results: List[Dict[str, Any]]
 
+class ProjectState(TypedDict, total=False):
+    """Full workflow state; each node returns only the keys it updates."""
+    project_name: str
+    description: str
+    requirements: str
+    architecture: str
+    tasks: List[Dict[str, Any]]
+    scaffold_files: List[Dict[str, str]]
+    code_files: List[Dict[str, str]]
+    candidates: Dict[str, List[str]]
+    test_results: List[Dict[str, Any]]
+
+
+# Decode caps (num_predict) per output kind. Output length dominates each
+# call's latency, and CPU decode is an order of magnitude slower than GPU,
+# so HARDWARE_MODE=cpu trades some detail for much shorter runs.
+HARDWARE_MODE = os.getenv("HARDWARE_MODE", "gpu").strip().lower()
+_OUTPUT_BUDGETS = {
+    "cpu": {"planning": 800, "code": 1024},
+    "gpu": {"planning": 3000, "code": 4096},
+}
+OUTPUT_BUDGETS = _OUTPUT_BUDGETS.get(HARDWARE_MODE, _OUTPUT_BUDGETS["gpu"])
+# The cap truncates; the prompt asks for a length that fits under it
+_PLANNING_LENGTH = f"\nKeep the whole answer under {OUTPUT_BUDGETS['planning'] * 3 // 4} words."
+
+# System prompts are module constants so every call sends byte-identical
+# text, which keeps cache keys and Ollama's prompt prefix stable.
+
+_PRODUCT_MANAGER_PROMPT = """You are an expert Product Manager.
+Analyze the project description and produce detailed technical requirements.
+Focus on core features, user stories, and acceptance criteria.
+Output in Markdown format.""" + _PLANNING_LENGTH
+
+_TECH_WRITER_PROMPT = """You are a Technical Writer.
+Write a README.md for a new project from its name and description.
+Include a project overview, a features list, and placeholder sections
+for installation and usage.
+Output only the Markdown content.""" + _PLANNING_LENGTH
+
+_ARCHITECT_PROMPT = """You are a Software Architect.
+Based on the requirements, design a software architecture.
+Identify necessary files, data structures, and tech stack components.
+
+IMPORTANT: For simple projects, prefer simple solutions:
+- For simple Python scripts, use single .py files that can run standalone
+- For simple web pages, use plain HTML/CSS/JS without frameworks
+- Only use React/Next.js/complex frameworks if the project REQUIRES them
+
+Output just the architecture description in Markdown.""" + _PLANNING_LENGTH
+
+_TECH_LEAD_PROMPT = """You are a Tech Lead.
+Based on the architecture, create a list of files that need to be created.
+Return a JSON object with a key 'files' which is a list of objects.
+Each object should have 'path' (relative file path) and 'purpose'.
+
+IMPORTANT RULES:
+- For simple Python projects: include main.py as entry point, requirements.txt if needed
+- For Node.js projects: include package.json with correct "scripts" section
+- The package.json "start" script must point to the correct entry file
+- Do NOT use JSX syntax in .js files unless you have proper build setup
+- For React projects, use create-react-app structure OR simple HTML
+
+Example JSON for Python:
+{
+  "files": [
+    {"path": "main.py", "purpose": "Main entry point"},
+    {"path": "requirements.txt", "purpose": "Python dependencies"},
+    {"path": "README.md", "purpose": "Project documentation"}
+  ]
+}
+
+Example JSON for Node.js:
+{
+  "files": [
+    {"path": "package.json", "purpose": "Node.js project config with start script"},
+    {"path": "index.js", "purpose": "Main entry point (must match package.json start script)"},
+    {"path": "README.md", "purpose": "Project documentation"}
+  ]
+}
+
+IMPORTANT: Return ONLY the JSON object, no markdown formatting."""
+
+_DEVELOPER_PROMPT = """You are a Senior Developer.
+Write the full code for the specified file based on the project requirements and architecture.
+
+CRITICAL RULES:
+1. Return ONLY the raw code content - no markdown blocks, no explanations
+2. For package.json: ensure "main" and "scripts.start" point to the actual entry file
+3. For .js files: Do NOT use JSX/React syntax unless it's for a proper React build setup
+4. For Python: write standalone scripts that can run with just 'python filename.py'
+5. Make the code complete and runnable - not stubs or placeholders
+6. Include proper error handling
+
+The code must be production-ready and work immediately when executed."""
+
+_FIX_PROMPT = """You are a Senior Developer fixing a bug.
+You are given code that has an error. Fix the error and return ONLY the corrected code.
+
+CRITICAL RULES:
+1. Return ONLY the raw code - no markdown blocks, no explanations
+2. The code must be complete and immediately runnable
+3. Fix the specific error mentioned
+4. For package.json, ensure paths are correct (use "./" for relative paths)
+5. Do NOT use JSX in .js files - use proper React/build setup or plain HTML"""
+
+
+# Token budgets for upstream outputs in the Developer/fix context. The PM and
+# architect are not direct parents of those steps (the Tech Lead's file list
+# is), so an excerpt is enough and keeps every per-file prefill short.
+REQUIREMENTS_CONTEXT_TOKENS = 500
+ARCHITECTURE_CONTEXT_TOKENS = 1000
+
+
+def _project_context(requirements: str, architecture: str) -> str:
+    """Shared project context appended to the Developer and fix prompts."""
+    requirements = tok_head(requirements, REQUIREMENTS_CONTEXT_TOKENS)
+    architecture = tok_head(architecture, ARCHITECTURE_CONTEXT_TOKENS)
+    return f"\n\nProject Requirements: {requirements}\nArchitecture: {architecture}"
+
+
+class _CallbackDispatcher:
+    """Runs agent log/update callbacks on one background thread, in submission order.
+    
+    Agents only enqueue, so a slow consumer (stdout, WebSocket broadcast)
+    never stalls an LLM coroutine or a worker thread.
+    """
+    
+    BATCH_SIZE = 64
+    
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def wrap(self, callback: Callable) -> Callable:
+        return functools.partial(self.submit, callback)
+    
+    def submit(self, callback: Callable, *args):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._drain, name="agent-callbacks", daemon=True)
+                    self._thread.start()
+        self._queue.put_nowait((callback, args))
+    
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything submitted so far has been delivered."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put_nowait((done.set, ()))
+        done.wait(timeout)
+    
+    def _drain(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for callback, args in batch:
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception("Agent callback error")
+
+
+_callbacks = _CallbackDispatcher()
+atexit.register(_callbacks.flush, 5)
+
+
+def flush_callbacks():
+    """Wait for queued agent logs and updates to reach their callbacks."""
+    _callbacks.flush()
+
 
 class BaseAgent:
-    def __init__(self, llm: BaseChatModel, log_callback: Callable, update_callback: Callable):
+    # Key into OUTPUT_BUDGETS; None leaves the shared LLM uncapped
+    OUTPUT_KIND: Optional[str] = None
+
+    def __init__(self, llm: BaseChatModel, log_callback: Callable, update_callback: Callable,
+                 cache: Optional[LLMCache] = None):
+        if self.OUTPUT_KIND:
+            # Shallow copy: shares the client and its connection pool
+            llm = llm.model_copy(update={"num_predict": OUTPUT_BUDGETS[self.OUTPUT_KIND]})
         self.llm = llm
-        self.log = log_callback
-        self.update = update_callback
+        self.log = _callbacks.wrap(log_callback)
+        self.update = _callbacks.wrap(update_callback)
+        self.cache = cache or get_llm_cache()
+
+    @property
+    def _model_name(self) -> str:
+        return getattr(self.llm, "model", "")
+
+    def _cache_key(self, system_prompt: str, user_content: str) -> Optional[str]:
+        """Exact-match cache key, or None when caching is off for this LLM."""
+        if not self.cache.active_for(self.llm):
+            return None
+        return self.cache.cache_key(self._model_name, [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ])
+
+    def _cache_similar(self, key: Optional[str], system_prompt: str,
+                       vector: Optional[List[float]]) -> Optional[str]:
+        """Semantic fallback; a hit is stored under the exact key for next time.
+        
+        The namespace pins the exact system prompt, which carries the large
+        shared context (requirements, architecture), so vectors only embed
+        the short per-call user message.
+        """
+        if not key:
+            return None
+        namespace = self.cache.namespace(self._model_name, system_prompt)
+        similar = self.cache.search(namespace, vector)
+        if similar is not None:
+            self.cache.set(key, namespace, similar, vector)
+        return similar
+
+    def _semantic_lookup(self, key: str, system_prompt: str, user_content: str) -> tuple:
+        """Semantic fallback after an exact miss; returns (response, prompt vector).
+        
+        An embedding failure (embed model missing, /api/embed error) is a
+        cache miss: the LLM itself may be healthy.
+        """
+        try:
+            vector = self.cache.embed([user_content])[0]
+            return self._cache_similar(key, system_prompt, vector), vector
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed, calling the LLM: %s", e)
+            return None, None
+
+    async def _asemantic_lookup(self, key: str, system_prompt: str, user_content: str) -> tuple:
+        """Async counterpart of `_semantic_lookup`."""
+        try:
+            vector = (await self.cache.aembed([user_content]))[0]
+            return self._cache_similar(key, system_prompt, vector), vector
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed, calling the LLM: %s", e)
+            return None, None
+
+    def _invoke_llm(self, system_prompt: str, user_content: str,
+                    on_chunk: Optional[Callable[[str], None]] = None,
+                    json_schema: Optional[Dict[str, Any]] = None,
+                    label: Optional[str] = None, semantic: bool = True) -> str:
+        """Complete a prompt; with `on_chunk`, tokens are streamed to it as they arrive.
+        
+        `json_schema` makes Ollama constrain decoding to JSON matching the schema.
+        `semantic=False` limits the cache to exact hits: a similar file or fix
+        prompt must not get another file's code (or a fix that already failed).
+        Every call is added to the latency metrics; streamed ones also log their
+        time to first token and decode rate under `label`.
+        """
+        key = self._cache_key(system_prompt, user_content)
+        vector = None
+        cached = self.cache.get(key) if key else None
+        if cached is None and key and semantic:
+            cached, vector = self._semantic_lookup(key, system_prompt, user_content)
+        if cached is not None:
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+        
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_content)
+        ]
+        kwargs = {"format": json_schema} if json_schema else {}
+        started = time.perf_counter()
+        if on_chunk is None:
+            message = self.llm.invoke(messages, **kwargs)
+            content = message.content
+            self._record_llm_stats(label, started, None, message)
+        else:
+            buf, first, chunk = [], None, None
+            for chunk in self.llm.stream(messages, **kwargs):
+                if chunk.content:
+                    first = first or time.perf_counter()
+                    on_chunk(chunk.content)
+                    buf.append(chunk.content)
+            content = "".join(buf)
+            self._record_llm_stats(label, started, first, chunk)
+        if key:
+            self.cache.set(key, self.cache.namespace(self._model_name, system_prompt), content, vector)
+        return content
 
-    def _invoke_llm(self, system_prompt: str, user_content: str) -> str:
+    async def _ainvoke_llm(self, system_prompt: str, user_content: str,
+                           on_chunk: Optional[Callable[[str], None]] = None,
+                           json_schema: Optional[Dict[str, Any]] = None,
+                           label: Optional[str] = None, semantic: bool = True) -> str:
+        """Async counterpart of `_invoke_llm` so independent prompts can run concurrently."""
+        key = self._cache_key(system_prompt, user_content)
+        vector = None
+        cached = self.cache.get(key) if key else None
+        if cached is None and key and semantic:
+            cached, vector = await self._asemantic_lookup(key, system_prompt, user_content)
+        if cached is not None:
+            if on_chunk:
+                on_chunk(cached)
+            return cached
+        
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_content)
         ]
-        response = self.llm.invoke(messages)
-        return response.content
+        kwargs = {"format": json_schema} if json_schema else {}
+        started = time.perf_counter()
+        if on_chunk is None:
+            message = await self.llm.ainvoke(messages, **kwargs)
+            content = message.content
+            self._record_llm_stats(label, started, None, message)
+        else:
+            buf, first, chunk = [], None, None
+            async for chunk in self.llm.astream(messages, **kwargs):
+                if chunk.content:
+                    first = first or time.perf_counter()
+                    on_chunk(chunk.content)
+                    buf.append(chunk.content)
+            content = "".join(buf)
+            self._record_llm_stats(label, started, first, chunk)
+        if key:
+            self.cache.set(key, self.cache.namespace(self._model_name, system_prompt), content, vector)
+        return content
+
+    def _record_llm_stats(self, label: Optional[str], started: float,
+                          first: Optional[float], last_message: Any):
+        """Add the call to the latency metrics; streamed calls also log TTFT and decode rate.
+        
+        Ollama's eval counters arrive on the final message (or chunk).
+        """
+        meta = getattr(last_message, "response_metadata", None) or {}
+        ttft = first - started if first is not None else None
+        get_llm_metrics().record(type(self).__name__, time.perf_counter() - started, ttft, meta)
+        if ttft is None:
+            return
+        count, duration = meta.get("eval_count"), meta.get("eval_duration")
+        rate = f", {count / (duration / 1e9):.1f} tok/s over {count} tokens" if count and duration else ""
+        self.log(f"⏱️ {label or type(self).__name__}: first token after {ttft:.2f}s{rate}")
 
     def _log_thought(self, thought: str):
         """Log an AI 'thought' for the frontend."""
         self.log(f"💭 [AI Thought]: {thought}")
 
     def _log_code_chunk(self, file_path: str, chunk: str):
-        """Log a code chunk for live streaming."""
-        self.log(f"📝 [Code] {file_path}: {chunk[:100]}...")
+        """Log a streamed code fragment; the frontend appends fragments per file."""
+        self.log(f"📝 [Code] {file_path}: {chunk}")
 
     def _log_terminal(self, output: str, is_error: bool = False):
         """Log terminal output."""
@@ -62,15 +410,13 @@ class BaseAgent:
 
 
 class ProductManagerAgent(BaseAgent):
+    OUTPUT_KIND = "planning"
     def analyze_requirements(self, state: Dict[str, Any]) -> Dict[str, Any]:
         self.update("analyze", "running", {})
         self.log(f"Product Manager: Analyzing '{state.get('project_name')}'...")
         self._log_thought("Reading project description and identifying key features...")
         
-        system_prompt = """You are an expert Product Manager. 
-        Analyze the project description and produce detailed technical requirements.
-        Focus on core features, user stories, and acceptance criteria.
-        Output in Markdown format."""
+        system_prompt = _PRODUCT_MANAGER_PROMPT
         
         description = state.get("description", "")
         self._log_thought("Formulating requirements document...")
@@ -82,22 +428,48 @@ class ProductManagerAgent(BaseAgent):
         return {"requirements": requirements}
 
 
+class TechnicalWriterAgent(BaseAgent):
+    """Drafts repository boilerplate that only depends on the project description."""
+    
+    OUTPUT_KIND = "planning"
+    GITIGNORE = """node_modules/
+__pycache__/
+*.py[cod]
+.venv/
+venv/
+.env
+dist/
+build/
+"""
+    
+    def scaffold_repo(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        self.update("writer", "running", {})
+        self.log("Tech Writer: Scaffolding repository (README, .gitignore)...")
+        
+        system_prompt = _TECH_WRITER_PROMPT
+        
+        readme = self._invoke_llm(
+            system_prompt,
+            f"Project Name: {state.get('project_name', '')}\nProject Description: {state.get('description', '')}"
+        )
+        
+        self.log("Tech Writer: Repository scaffold ready.")
+        self.update("writer", "completed", {})
+        
+        return {"scaffold_files": [
+            {"path": "README.md", "content": readme},
+            {"path": ".gitignore", "content": self.GITIGNORE}
+        ]}
+
+
 class SoftwareArchitectAgent(BaseAgent):
+    OUTPUT_KIND = "planning"
     def design_architecture(self, state: Dict[str, Any]) -> Dict[str, Any]:
         self.update("plan", "running", {})
         self.log("Architect: Designing system architecture...")
         self._log_thought("Analyzing requirements to determine optimal tech stack...")
         
-        system_prompt = """You are a Software Architect.
-        Based on the requirements, design a software architecture.
-        Identify necessary files, data structures, and tech stack components.
-        
-        IMPORTANT: For simple projects, prefer simple solutions:
-        - For simple Python scripts, use single .py files that can run standalone
-        - For simple web pages, use plain HTML/CSS/JS without frameworks
-        - Only use React/Next.js/complex frameworks if the project REQUIRES them
-        
-        Output just the architecture description in Markdown."""
+        system_prompt = _ARCHITECT_PROMPT
         
         requirements = state.get("requirements", "")
         self._log_thought("Creating architecture blueprint...")
@@ -110,51 +482,41 @@ class SoftwareArchitectAgent(BaseAgent):
 
 
 class TechLeadAgent(BaseAgent):
+    OUTPUT_KIND = "planning"
+    FILES_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "files": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string"},
+                        "purpose": {"type": "string"}
+                    },
+                    "required": ["path", "purpose"]
+                }
+            }
+        },
+        "required": ["files"]
+    }
+    
     def breakdown_tasks(self, state: Dict[str, Any]) -> Dict[str, Any]:
         self.update("plan", "running", {})
         self.log("Tech Lead: Breaking down tasks and file structure...")
         self._log_thought("Decomposing architecture into implementable file structure...")
         
-        system_prompt = """You are a Tech Lead.
-        Based on the architecture, create a list of files that need to be created.
-        Return a JSON object with a key 'files' which is a list of objects.
-        Each object should have 'path' (relative file path) and 'purpose'.
-        
-        IMPORTANT RULES:
-        - For simple Python projects: include main.py as entry point, requirements.txt if needed
-        - For Node.js projects: include package.json with correct "scripts" section
-        - The package.json "start" script must point to the correct entry file
-        - Do NOT use JSX syntax in .js files unless you have proper build setup
-        - For React projects, use create-react-app structure OR simple HTML
-        
-        Example JSON for Python:
-        {
-          "files": [
-            {"path": "main.py", "purpose": "Main entry point"},
-            {"path": "requirements.txt", "purpose": "Python dependencies"},
-            {"path": "README.md", "purpose": "Project documentation"}
-          ]
-        }
-        
-        Example JSON for Node.js:
-        {
-          "files": [
-            {"path": "package.json", "purpose": "Node.js project config with start script"},
-            {"path": "index.js", "purpose": "Main entry point (must match package.json start script)"},
-            {"path": "README.md", "purpose": "Project documentation"}
-          ]
-        }
-        
-        IMPORTANT: Return ONLY the JSON object, no markdown formatting."""
+        system_prompt = _TECH_LEAD_PROMPT
         
         architecture = state.get("architecture", "")
-        response = self._invoke_llm(system_prompt, f"Architecture: {architecture}")
-        
-        # Simple heuristic to extract JSON if LLM wraps it
-        cleaned_response = response.replace("```json", "").replace("```", "").strip()
+        # Structured output: decoding is constrained to the schema, so the
+        # response is parsed as-is
+        response = self._invoke_llm(
+            system_prompt, f"Architecture: {architecture}", json_schema=self.FILES_SCHEMA
+        )
         
         try:
-            tasks_data = json.loads(cleaned_response)
+            tasks_data = _json.loads(response.encode("utf-8"))
             files = tasks_data.get("files", [])
         except Exception as e:
             self.log(f"Tech Lead Warning: Could not parse JSON tasks. Using default. Error: {e}")
@@ -165,18 +527,32 @@ class TechLeadAgent(BaseAgent):
 
 
 class DeveloperAgent(BaseAgent):
-    def write_code(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    OUTPUT_KIND = "code"
+    # Files small models most often get wrong; with DEVELOPER_CANDIDATES > 1
+    # (opt-in, each draft is a full generation) QA picks among several drafts
+    CRITICAL_FILES = ("package.json", "main.py", "index.js")
+    CANDIDATES = int(os.getenv("DEVELOPER_CANDIDATES", "1"))
+    
+    async def write_code(self, state: Dict[str, Any]) -> Dict[str, Any]:
         self.update("frontend_dev", "running", {})
         self.log("Developer: Starting coding phase...")
         self._log_thought("Preparing to implement all planned files...")
         
-        tasks = state.get("tasks", [])
         requirements = state.get("requirements", "")
         architecture = state.get("architecture", "")
         
-        generated_files = []
+        # Files drafted by the scaffold step are reused instead of regenerated
+        scaffold_files = state.get("scaffold_files", [])
+        scaffolded = {f["path"] for f in scaffold_files}
+        tasks = [t for t in state.get("tasks", []) if t.get("path") not in scaffolded]
+        
+        system_prompt = _DEVELOPER_PROMPT + _project_context(requirements, architecture)
         
-        for i, file_info in enumerate(tasks):
+        # Each file only depends on requirements + architecture, so all prompts
+        # are issued at once and Ollama serves them concurrently (bounded by
+        # OLLAMA_NUM_PARALLEL on the server side).
+        prompts = []
+        for file_info in tasks:
             file_path = file_info.get("path")
             purpose = file_info.get("purpose")
             
@@ -184,43 +560,58 @@ class DeveloperAgent(BaseAgent):
             self.log(f"Developer: Writing {file_path}...")
             self._log_thought(f"Implementing {file_path} - {purpose}")
             
-            system_prompt = """You are a Senior Developer.
-            Write the full code for the specified file based on the project requirements and architecture.
-            
-            CRITICAL RULES:
-            1. Return ONLY the raw code content - no markdown blocks, no explanations
-            2. For package.json: ensure "main" and "scripts.start" point to the actual entry file
-            3. For .js files: Do NOT use JSX/React syntax unless it's for a proper React build setup
-            4. For Python: write standalone scripts that can run with just 'python filename.py'
-            5. Make the code complete and runnable - not stubs or placeholders
-            6. Include proper error handling
-            
-            The code must be production-ready and work immediately when executed."""
-            
+            # Shared context lives in the system prompt so every call has a
+            # byte-identical prefix that Ollama's KV cache can reuse
             user_msg = f"""
-            Project Requirements: {requirements}
-            Architecture: {architecture}
-            
             File to write: {file_path}
             Purpose: {purpose}
             
             Write the complete content for this file.
             """
-            
-            code_content = self._invoke_llm(system_prompt, user_msg)
+            prompts.append(user_msg)
+        
+        # Critical files get extra samples, generated alongside everything
+        # else. With caching active identical prompts would share one answer.
+        extra = 0 if self.cache.active_for(self.llm) else max(self.CANDIDATES - 1, 0)
+        critical = [i for i, t in enumerate(tasks) if t.get("path", "").endswith(self.CRITICAL_FILES)]
+        
+        # Tokens are forwarded as they arrive, so the frontend shows each file
+        # from its first token rather than after the whole file is generated
+        results = await asyncio.gather(*[
+            self._ainvoke_llm(
+                system_prompt, p,
+                on_chunk=lambda c, path=t.get("path"): self._log_code_chunk(path, c),
+                label=t.get("path"), semantic=False
+            )
+            for t, p in zip(tasks, prompts)
+        ], *[
+            self._ainvoke_llm(system_prompt, prompts[i], semantic=False)
+            for i in critical for _ in range(extra)
+        ])
+        responses, alternates = results[:len(tasks)], results[len(tasks):]
+        
+        candidates = {}
+        for n, i in enumerate(critical):
+            path = tasks[i].get("path")
+            candidates[path] = [
+                self._clean_code_content(c, path) for c in alternates[n * extra:(n + 1) * extra]
+            ]
+        
+        generated_files = []
+        for file_info, code_content in zip(tasks, responses):
+            file_path = file_info.get("path")
             
             # Clean up markdown code blocks if LLM adds them
             code_content = self._clean_code_content(code_content, file_path)
             
-            # Stream the code chunk
-            self._log_code_chunk(file_path, code_content)
-            
             generated_files.append({"path": file_path, "content": code_content})
             self.log(f"Developer: Completed {file_path}")
+        
+        generated_files.extend(scaffold_files)
             
         self.update("frontend_dev", "completed", {})
         self._log_thought("All files written. Ready for QA testing.")
-        return {"code_files": generated_files}
+        return {"code_files": generated_files, "candidates": {p: c for p, c in candidates.items() if c}}
     
     def _clean_code_content(self, content: str, file_path: str) -> str:
         """Remove markdown code blocks from LLM output."""
@@ -234,13 +625,51 @@ class DeveloperAgent(BaseAgent):
         return content
 
 
+@functools.lru_cache(maxsize=32)
+def _path_matcher(paths: frozenset) -> tuple:
+    """Compile one alternation over all project paths (and their Windows spellings).
+    
+    Cached on the path set, which rarely changes between fix attempts.
+    """
+    variants = {}
+    for path in paths:
+        variants[path] = path
+        variants[path.replace("/", "\\")] = path
+    # Longest first so "src/main.py" wins over "main.py" at the same position
+    alternation = "|".join(re.escape(v) for v in sorted(variants, key=len, reverse=True))
+    return re.compile(alternation), variants
+
+
+@functools.lru_cache(maxsize=None)
+def _which(executable: str) -> Optional[str]:
+    """PATH lookup done once per executable name."""
+    return shutil.which(executable)
+
+
 class QAEngineerAgent(BaseAgent):
     """QA Engineer that tests COMPLETE projects, not individual files."""
     
+    OUTPUT_KIND = "code"  # fix prompts return whole files
     MAX_FIX_ATTEMPTS = 3
     EXECUTION_TIMEOUT = 60  # seconds for full project test
+    MANIFESTS = ("package.json", "requirements.txt")
+    STAGES = ("install", "run")  # order in which a project test can fail
+    FIX_TIME_BUDGET = 300  # seconds; no new fix is started once exceeded
+    OUTPUT_LINES = 500  # per stream; older subprocess output is dropped
+    LINE_LIMIT = 2 ** 20  # bytes; longer subprocess lines are split
+    NPM = "npm.cmd" if os.name == "nt" else "npm"  # no shell to resolve the .cmd shim
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Manifest path -> sha256 of the content that was last installed
+        self._installed_manifests: Dict[str, str] = {}
+        # requirements.txt sha256 -> its pip install. pip writes to this
+        # service's own environment, so candidate sandboxes with the same
+        # requirements share one install, and distinct ones run one at a time
+        self._pip_installs: Dict[str, asyncio.Future] = {}
+        self._pip_lock = asyncio.Lock()
     
-    def validate_and_test(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    async def validate_and_test(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Entry point for the LangGraph node."""
         self.update("qa_engineer", "running", {})
         self.log("🧪 QA Engineer: Starting FULL PROJECT validation...")
@@ -253,58 +682,129 @@ class QAEngineerAgent(BaseAgent):
         project_type = self._detect_project_type(code_files)
         self.log(f"🔍 QA: Detected project type: {project_type}")
         
-        # Create persistent temp directory for testing
-        temp_dir = tempfile.mkdtemp(prefix="qa_test_")
+        # Alternative generations of critical files give extra candidate sets;
+        # all sets get their first test run side by side
+        variants = self._candidate_variants(code_files, state.get("candidates", {}))
         
-        try:
-            # Write all files to temp directory
-            for file_info in code_files:
-                file_path = file_info.get("path")
-                content = file_info.get("content")
-                full_path = os.path.join(temp_dir, file_path)
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                with open(full_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                self.log(f"📁 QA: Staged {file_path}")
+        # Persistent temp directories for the whole fix loop, removed on exit
+        with contextlib.ExitStack() as stack:
+            temp_dirs = [
+                stack.enter_context(tempfile.TemporaryDirectory(prefix="qa_test_", ignore_cleanup_errors=True))
+                for _ in variants
+            ]
+            
+            self.log(f"🔄 QA: Test attempt 1/{self.MAX_FIX_ATTEMPTS}")
+            # Separate ports keep servers from concurrent candidates apart
+            envs = [None] if len(variants) == 1 else [{"PORT": str(self._free_port())} for _ in variants]
+            firsts = await asyncio.gather(*[
+                self._stage_and_test(temp_dir, files, project_type, env)
+                for temp_dir, files, env in zip(temp_dirs, variants, envs)
+            ])
+            
+            winner = next((i for i, (result, _) in enumerate(firsts) if result["success"]), 0)
+            if len(variants) > 1:
+                self.log(f"🗳️ QA: Continuing with candidate set {winner + 1}/{len(variants)}")
             
             # Run full project test with fix loop
-            fixed_files, test_results = self._test_and_fix_project(
-                temp_dir, 
-                code_files, 
+            fixed_files, test_results = await self._test_and_fix_project(
+                temp_dirs[winner], 
+                variants[winner], 
                 project_type,
                 state.get("requirements", ""),
-                state.get("architecture", "")
+                state.get("architecture", ""),
+                firsts[winner]
             )
             
             self.update("qa_engineer", "completed", {})
             self.log("🏁 QA Engineer: Full project validation complete!")
             
             return {"code_files": fixed_files, "test_results": test_results}
-            
-        finally:
-            # Clean up temp directory
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
     
-    def _test_and_fix_project(self, temp_dir: str, code_files: List[Dict], 
-                               project_type: str, requirements: str, architecture: str) -> tuple:
+    @staticmethod
+    def _candidate_variants(code_files: List[Dict[str, str]],
+                            candidates: Dict[str, List[str]]) -> List[List[Dict[str, str]]]:
+        """The generated file set, plus one set per alternative of the critical files."""
+        variants = [code_files]
+        for i in range(max((len(c) for c in candidates.values()), default=0)):
+            variants.append([
+                {"path": f["path"], "content": candidates[f["path"]][i]}
+                if i < len(candidates.get(f["path"], [])) else f
+                for f in code_files
+            ])
+        return variants
+    
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+    
+    async def _stage_and_test(self, temp_dir: str, code_files: List[Dict[str, str]],
+                              project_type: str, env: Optional[Dict[str, str]] = None) -> tuple:
+        """Stage a file set into its sandbox and run the first test attempt."""
+        # Stage dependency manifests first so installs download while
+        # the remaining files are written
+        manifests = [f for f in code_files if f.get("path") in self.MANIFESTS]
+        await asyncio.to_thread(self._stage_files, temp_dir, manifests)
+        install = asyncio.ensure_future(self._install_dependencies(temp_dir))
+        
+        sources = [f for f in code_files if f.get("path") not in self.MANIFESTS]
+        await asyncio.to_thread(self._stage_files, temp_dir, sources)
+        
+        return await self._run_attempt(temp_dir, project_type, install, env)
+    
+    async def _run_attempt(self, temp_dir: str, project_type: str,
+                           install: Optional[asyncio.Future] = None,
+                           env: Optional[Dict[str, str]] = None) -> tuple:
+        """Install dependencies and run the project; returns (result, failed stage)."""
+        result = await (install or self._install_dependencies(temp_dir))
+        if result is not None:
+            return result, "install"
+        
+        # Run the appropriate test based on project type
+        if project_type == "node":
+            result = await self._test_node_project(temp_dir, env)
+        elif project_type == "python":
+            result = await self._test_python_project(temp_dir, env)
+        else:
+            result = {"success": True, "stdout": "No executable test available", "stderr": ""}
+        return result, "run"
+    
+    def _stage_files(self, temp_dir: str, files: List[Dict[str, str]]):
+        """Write files into the sandbox, fanning the writes out over a thread pool."""
+        if not files:
+            return
+        
+        # Create each parent directory once instead of once per file
+        for parent in {os.path.dirname(os.path.join(temp_dir, f.get("path"))) for f in files}:
+            os.makedirs(parent, exist_ok=True)
+        
+        def write_one(file_info: Dict[str, str]):
+            with open(os.path.join(temp_dir, file_info.get("path")), "wb") as f:
+                f.write(file_info.get("content").encode("utf-8"))
+            self.log(f"📁 QA: Staged {file_info.get('path')}")
+        
+        with ThreadPoolExecutor(max_workers=min(32, len(files))) as pool:
+            list(pool.map(write_one, files))
+    
+    async def _test_and_fix_project(self, temp_dir: str, code_files: List[Dict], 
+                               project_type: str, requirements: str, architecture: str,
+                               first: Optional[tuple] = None) -> tuple:
         """Test the complete project and fix errors iteratively."""
         
         test_results = []
         current_files = {f["path"]: f["content"] for f in code_files}
+        last_fix = None  # pre-fix contents, stage and result of the previous fix
+        seen_errors = set()
+        started = time.monotonic()
         
         for attempt in range(self.MAX_FIX_ATTEMPTS):
-            self.log(f"🔄 QA: Test attempt {attempt + 1}/{self.MAX_FIX_ATTEMPTS}")
-            
-            # Run the appropriate test based on project type
-            if project_type == "node":
-                result = self._test_node_project(temp_dir)
-            elif project_type == "python":
-                result = self._test_python_project(temp_dir)
+            # The first attempt was already run while staging
+            if attempt == 0 and first is not None:
+                result, stage = first
             else:
-                result = {"success": True, "stdout": "No executable test available", "stderr": ""}
+                self.log(f"🔄 QA: Test attempt {attempt + 1}/{self.MAX_FIX_ATTEMPTS}")
+                result, stage = await self._run_attempt(temp_dir, project_type)
             
             test_results.append({
                 "attempt": attempt + 1,
@@ -314,6 +814,18 @@ class QAEngineerAgent(BaseAgent):
                 "stderr": result.get("stderr", "")
             })
             
+            signature = None if result["success"] else self._error_signature(result, temp_dir)
+            
+            # A fix that makes the project fail at an earlier step (e.g. a
+            # rewritten package.json that no longer installs) is rolled back,
+            # and the next fix works from the error it was meant to address
+            if (not result["success"] and last_fix
+                    and self.STAGES.index(stage) < self.STAGES.index(last_fix["stage"])):
+                self.log(f"↩️ QA: Fix broke the {stage} step, rolling back {', '.join(last_fix['previous'])}")
+                current_files.update(last_fix["previous"])
+                await asyncio.to_thread(self._stage_files, temp_dir, [{"path": p, "content": c} for p, c in last_fix["previous"].items()])
+                result, stage = last_fix["result"], last_fix["stage"]
+            
             if result["success"]:
                 self.log("✅ QA: Project test PASSED!")
                 self._log_terminal(result.get("stdout", "Test passed"))
@@ -323,103 +835,248 @@ class QAEngineerAgent(BaseAgent):
                 error_msg = result.get("stderr", "") or result.get("stdout", "Unknown error")
                 self._log_terminal(error_msg, is_error=True)
                 
+                # Stop when the model is looping on an identical error or
+                # the QA time budget is spent; another fix rarely helps
+                if signature in seen_errors:
+                    self.log("🛑 QA: Same error as a previous attempt, stopping fix loop")
+                    break
+                seen_errors.add(signature)
+                if time.monotonic() - started > self.FIX_TIME_BUDGET:
+                    self.log(f"🛑 QA: Fix budget of {self.FIX_TIME_BUDGET}s exhausted")
+                    break
+                
                 if attempt < self.MAX_FIX_ATTEMPTS - 1:
                     self._log_thought("Analyzing project-wide error and fixing...")
                     
                     # Identify which file(s) need fixing based on error
-                    files_to_fix = self._identify_files_to_fix(error_msg, current_files)
+                    files_to_fix = [
+                        p for p in self._identify_files_to_fix(error_msg, current_files)
+                        if p in current_files
+                    ]
                     
+                    # Fixes to distinct files are independent LLM calls
                     for file_path in files_to_fix:
-                        if file_path in current_files:
-                            self.log(f"🔧 QA: Fixing {file_path}...")
-                            fixed_content = self._fix_code(
-                                file_path,
-                                current_files[file_path],
-                                error_msg,
-                                requirements,
-                                architecture
-                            )
-                            current_files[file_path] = fixed_content
-                            
-                            # Update file in temp dir
-                            full_path = os.path.join(temp_dir, file_path)
-                            with open(full_path, "w", encoding="utf-8") as f:
-                                f.write(fixed_content)
+                        self.log(f"🔧 QA: Fixing {file_path}...")
+                    fixed_contents = await asyncio.gather(*[
+                        self._fix_code(
+                            file_path,
+                            current_files[file_path],
+                            error_msg,
+                            requirements,
+                            architecture
+                        )
+                        for file_path in files_to_fix
+                    ])
+                    
+                    last_fix = {
+                        "previous": {p: current_files[p] for p in files_to_fix},
+                        "stage": stage,
+                        "result": result
+                    }
+                    
+                    # Update files in temp dir in a single pass
+                    current_files.update(zip(files_to_fix, fixed_contents))
+                    await asyncio.to_thread(self._stage_files, temp_dir, [{"path": p, "content": current_files[p]} for p in files_to_fix])
         
         # Return fixed files
         fixed_files = [{"path": p, "content": c} for p, c in current_files.items()]
         return fixed_files, test_results
     
-    def _test_node_project(self, temp_dir: str) -> Dict[str, Any]:
-        """Test a Node.js project with npm install && npm start."""
+    @staticmethod
+    def _error_signature(result: Dict[str, Any], temp_dir: str) -> str:
+        """Hash of the failure output with sandbox paths and numbers masked."""
+        error = result.get("stderr", "") or result.get("stdout", "")
+        normalized = re.sub(r"\d+", "#", error.replace(temp_dir, ""))
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    
+    async def _run_process(self, *cmd: str, cwd: str, timeout: float,
+                           env: Optional[Dict[str, str]] = None, live: bool = False) -> tuple:
+        """Run a command without a shell; returns (returncode, stdout, stderr).
+        
+        Output is read line by line and only the last OUTPUT_LINES of each
+        stream are kept; with `live`, lines go to the terminal as they arrive.
+        Raises asyncio.TimeoutError after killing the process, and
+        FileNotFoundError when the executable is not on PATH.
+        """
+        executable = _which(cmd[0])
+        if executable is None:
+            raise FileNotFoundError(f"{cmd[0]} not found on PATH")
+        proc = await asyncio.create_subprocess_exec(
+            executable, *cmd[1:],
+            cwd=cwd,
+            env={**os.environ, **env} if env else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Own process group, so a timeout also kills e.g. the node child of npm start
+            start_new_session=os.name != "nt"
+        )
+        stdout = collections.deque(maxlen=self.OUTPUT_LINES)
+        stderr = collections.deque(maxlen=self.OUTPUT_LINES)
+        
+        async def pump(stream: asyncio.StreamReader, lines: collections.deque, is_error: bool):
+            def emit(raw: bytes):
+                line = raw.decode("utf-8", errors="replace")
+                lines.append(line + "\n")
+                if live:
+                    self._log_terminal(line, is_error=is_error)
+            
+            pending = b""
+            while chunk := await stream.read(65536):
+                *complete, pending = (pending + chunk).split(b"\n")
+                for raw in complete:
+                    emit(raw)
+                if len(pending) > self.LINE_LIMIT:  # flush runaway lines in pieces
+                    emit(pending)
+                    pending = b""
+            if pending:
+                emit(pending)
+        
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                pump(proc.stdout, stdout, False),
+                pump(proc.stderr, stderr, True),
+                proc.wait()
+            ), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._kill_process_tree(proc)
+            await proc.wait()
+            raise
+        return proc.returncode, "".join(stdout), "".join(stderr)
+    
+    @staticmethod
+    def _kill_process_tree(proc: asyncio.subprocess.Process):
+        """Kill the process and, on POSIX, its whole process group.
         
-        # Step 1: npm install
+        Concurrent candidates would otherwise find a leftover server still
+        holding their PORT.
+        """
+        try:
+            if os.name == "nt":
+                proc.kill()
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    
+    async def _install_dependencies(self, temp_dir: str) -> Optional[Dict[str, Any]]:
+        """Install Node and Python dependencies concurrently.
+        
+        Returns a failed test result, or None when the project can be run.
+        """
+        installers = {"package.json": self._npm_install, "requirements.txt": self._pip_install}
+        pending = {}
+        for manifest, installer in installers.items():
+            path = os.path.join(temp_dir, manifest)
+            if not os.path.exists(path):
+                continue
+            # Fix attempts usually only touch source files; skip the
+            # reinstall when the manifest is byte-for-byte unchanged
+            digest = self._file_hash(path)
+            if self._installed_manifests.get(path) == digest:
+                self.log(f"♻️ QA: {manifest} unchanged, reusing installed dependencies")
+                continue
+            if manifest == "requirements.txt":
+                pending[path] = (digest, self._shared_pip_install(temp_dir, digest))
+            else:
+                pending[path] = (digest, installer(temp_dir))
+        
+        results = await asyncio.gather(*[install for _, install in pending.values()])
+        failure = None
+        for (path, (digest, _)), result in zip(pending.items(), results):
+            if result is None:
+                self._installed_manifests[path] = digest
+            elif failure is None:
+                failure = result
+        return failure
+    
+    @staticmethod
+    def _file_hash(path: str) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    
+    async def _npm_install(self, temp_dir: str) -> Optional[Dict[str, Any]]:
         self.log("📦 QA: Running npm install...")
         self._log_terminal("$ npm install")
         
         try:
-            install_result = subprocess.run(
-                ["npm", "install"],
-                capture_output=True,
-                text=True,
-                timeout=120,
-                cwd=temp_dir,
-                shell=True
+            returncode, stdout, stderr = await self._run_process(
+                self.NPM, "install", cwd=temp_dir, timeout=120, live=True
             )
             
-            if install_result.returncode != 0:
+            if returncode != 0:
                 return {
                     "success": False,
-                    "stdout": install_result.stdout,
-                    "stderr": f"npm install failed: {install_result.stderr}"
+                    "stdout": stdout,
+                    "stderr": f"npm install failed: {stderr}"
                 }
             
             self.log("✅ QA: npm install succeeded")
-            self._log_terminal(install_result.stdout[:500] if install_result.stdout else "Installed")
+            return None
             
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             return {"success": False, "stdout": "", "stderr": "npm install timed out"}
         except Exception as e:
             return {"success": False, "stdout": "", "stderr": f"npm install error: {str(e)}"}
+    
+    async def _shared_pip_install(self, temp_dir: str, digest: str) -> Optional[Dict[str, Any]]:
+        """Join the pip install already running for this requirements digest, or start it."""
+        install = self._pip_installs.get(digest)
+        if install is None:
+            install = self._pip_installs[digest] = asyncio.ensure_future(self._pip_install(temp_dir))
+        # One cancelled waiter must not cancel the install the others share
+        return await asyncio.shield(install)
+    
+    async def _pip_install(self, temp_dir: str) -> Optional[Dict[str, Any]]:
+        async with self._pip_lock:
+            self.log("📦 QA: Installing Python dependencies...")
+            self._log_terminal("$ pip install -r requirements.txt")
+            try:
+                await self._run_process(
+                    "pip", "install", "-r", "requirements.txt", "-q", cwd=temp_dir, timeout=60, live=True
+                )
+            except Exception:
+                pass  # Continue even if install fails
+        return None
+    
+    async def _test_node_project(self, temp_dir: str, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Test a Node.js project with npm start (dependencies are already installed)."""
         
-        # Step 2: npm start (with timeout - we just check if it starts without error)
+        # npm start (with timeout - we just check if it starts without error)
         self.log("🚀 QA: Running npm start (quick test)...")
         self._log_terminal("$ npm start")
         
         try:
             # Run npm start with a short timeout - just to check for immediate errors
-            start_result = subprocess.run(
-                ["npm", "start"],
-                capture_output=True,
-                text=True,
-                timeout=15,  # Short timeout - we just want to see if it crashes immediately
+            returncode, stdout, stderr = await self._run_process(
+                self.NPM, "start",
                 cwd=temp_dir,
-                shell=True
+                timeout=15,  # Short timeout - we just want to see if it crashes immediately
+                env=env
             )
             
             # If it exits quickly with error, that's a failure
-            if start_result.returncode != 0:
+            if returncode != 0:
                 return {
                     "success": False,
-                    "stdout": start_result.stdout,
-                    "stderr": start_result.stderr
+                    "stdout": stdout,
+                    "stderr": stderr
                 }
             
             return {
                 "success": True,
-                "stdout": start_result.stdout or "Started successfully",
+                "stdout": stdout or "Started successfully",
                 "stderr": ""
             }
             
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             # Timeout is actually good for servers - means it started and is running
             self.log("✅ QA: Project started successfully (running)")
             return {"success": True, "stdout": "Server started and running", "stderr": ""}
         except Exception as e:
             return {"success": False, "stdout": "", "stderr": f"npm start error: {str(e)}"}
     
-    def _test_python_project(self, temp_dir: str) -> Dict[str, Any]:
-        """Test a Python project."""
+    async def _test_python_project(self, temp_dir: str, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Test a Python project (dependencies are already installed)."""
         
         # Find main entry point
         entry_points = ["main.py", "app.py", "run.py", "server.py", "__main__.py"]
@@ -439,66 +1096,56 @@ class QAEngineerAgent(BaseAgent):
         if not main_file:
             return {"success": True, "stdout": "No Python entry point found", "stderr": ""}
         
-        # Install requirements if exists
-        req_file = os.path.join(temp_dir, "requirements.txt")
-        if os.path.exists(req_file):
-            self.log("📦 QA: Installing Python dependencies...")
-            self._log_terminal("$ pip install -r requirements.txt")
-            try:
-                subprocess.run(
-                    ["pip", "install", "-r", req_file, "-q"],
-                    capture_output=True,
-                    timeout=60,
-                    cwd=temp_dir
-                )
-            except:
-                pass  # Continue even if install fails
-        
         # Run the Python script
         self.log(f"🐍 QA: Running python {main_file}...")
         self._log_terminal(f"$ python {main_file}")
         
         try:
-            result = subprocess.run(
-                ["python", main_file],
-                capture_output=True,
-                text=True,
+            returncode, stdout, stderr = await self._run_process(
+                "python", main_file,
+                cwd=temp_dir,
                 timeout=self.EXECUTION_TIMEOUT,
-                cwd=temp_dir
+                env=env
             )
             
             return {
-                "success": result.returncode == 0,
-                "stdout": result.stdout,
-                "stderr": result.stderr
+                "success": returncode == 0,
+                "stdout": stdout,
+                "stderr": stderr
             }
             
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             # For servers, timeout means it's running
             return {"success": True, "stdout": "Script running (server mode)", "stderr": ""}
         except Exception as e:
             return {"success": False, "stdout": "", "stderr": str(e)}
     
     def _detect_project_type(self, code_files: List[Dict]) -> str:
-        """Detect project type from files."""
-        paths = [f.get("path", "") for f in code_files]
+        """Detect project type from files in a single pass (Node wins outright)."""
+        has_py = has_html = False
+        for f in code_files:
+            path = f.get("path", "")
+            if path.endswith("package.json"):
+                return "node"
+            if path.endswith(".py"):
+                has_py = True
+            elif path.endswith(".html"):
+                has_html = True
         
-        if any("package.json" in p for p in paths):
-            return "node"
-        if any(p.endswith(".py") for p in paths):
+        if has_py:
             return "python"
-        if any(p.endswith(".html") for p in paths):
+        if has_html:
             return "html"
         return "unknown"
     
     def _identify_files_to_fix(self, error_msg: str, current_files: Dict[str, str]) -> List[str]:
         """Identify which files need fixing based on error message."""
+        # Look for file paths in error message with a single scan
         files_to_fix = []
-        
-        # Look for file paths in error message
-        for file_path in current_files.keys():
-            if file_path in error_msg or file_path.replace("/", "\\") in error_msg:
-                files_to_fix.append(file_path)
+        if current_files:
+            pattern, variants = _path_matcher(frozenset(current_files))
+            mentioned = {variants[m.group(0)] for m in pattern.finditer(error_msg)}
+            files_to_fix = [p for p in current_files if p in mentioned]
         
         # If no specific file found, fix main entry points
         if not files_to_fix:
@@ -510,21 +1157,12 @@ class QAEngineerAgent(BaseAgent):
         
         return files_to_fix[:2]  # Fix at most 2 files per iteration
     
-    def _fix_code(self, file_path: str, content: str, error: str, 
+    async def _fix_code(self, file_path: str, content: str, error: str, 
                   requirements: str, architecture: str) -> str:
         """Use LLM to fix the code based on the error."""
         self._log_thought(f"Analyzing error for {file_path}: {error[:100]}...")
         
-        system_prompt = """You are a Senior Developer fixing a bug.
-        You are given code that has an error. Fix the error and return ONLY the corrected code.
-        
-        CRITICAL RULES:
-        1. Return ONLY the raw code - no markdown blocks, no explanations
-        2. The code must be complete and immediately runnable
-        3. Fix the specific error mentioned
-        4. For package.json, ensure paths are correct (use "./" for relative paths)
-        5. Do NOT use JSX in .js files - use proper React/build setup or plain HTML
-        """
+        system_prompt = _FIX_PROMPT + _project_context(requirements, architecture)
         
         user_msg = f"""
         File: {file_path}
@@ -538,7 +1176,7 @@ class QAEngineerAgent(BaseAgent):
         Fix this code so the project runs without errors. Return only the corrected code.
         """
         
-        fixed_content = self._invoke_llm(system_prompt, user_msg)
+        fixed_content = await self._ainvoke_llm(system_prompt, user_msg, semantic=False)
         
         # Clean up markdown blocks
         if fixed_content.startswith("```"):
@@ -0,0 +1,3 @@
+# test_agents.py is an end-to-end script against a running Ollama
+# (python test_agents.py), not a unit test module
+collect_ignore = ["test_agents.py"]
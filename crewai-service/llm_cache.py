@@ -0,0 +1,171 @@
+"""
+LLM Response Cache
+Exact-match and semantic caching of LLM completions shared by all agents.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class LLMCache:
+    """
+    In-memory LRU cache of LLM responses.
+
+    Lookups first try an exact SHA-256 key of (model, messages[, options]). When an
+    embedding model is configured, misses fall back to a cosine-similarity
+    search over the stored prompt embeddings so near-identical prompts
+    (same description, repeated fix attempts) reuse a previous answer.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: int = 3600, enabled: bool = False,
+                 embed_model: Optional[str] = None, threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, Tuple[float, str, str, Optional[List[float]]]]" = OrderedDict()
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+            ttl=int(os.getenv("LLM_CACHE_TTL", "3600")),
+            enabled=_truthy(os.getenv("LLM_CACHE")),
+            embed_model=os.getenv("LLM_CACHE_EMBED_MODEL") or None,
+            threshold=float(os.getenv("LLM_CACHE_THRESHOLD", "0.92")),
+        )
+
+    # --- Policy ---
+
+    def active_for(self, llm: Any) -> bool:
+        """Sampling at temperature > 0 is only cached when explicitly enabled."""
+        return self.enabled or getattr(llm, "temperature", None) == 0
+
+    @property
+    def semantic(self) -> bool:
+        return bool(self.embed_model)
+
+    # --- Exact match ---
+
+    @staticmethod
+    def cache_key(model: str, messages: List[Dict[str, str]],
+                  options: Optional[Dict[str, Any]] = None) -> str:
+        """`options` (sampling settings) only enter the key when given."""
+        payload = {"model": model, "messages": messages}
+        if options:
+            payload["options"] = options
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def namespace(model: str, system_prompt: str) -> str:
+        return f"{model}:{hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()[:16]}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, namespace: str, value: str, vector: Optional[List[float]] = None):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), namespace, value, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Semantic match ---
+
+    def search(self, namespace: str, vector: Optional[List[float]]) -> Optional[str]:
+        """
+        Return the stored response whose prompt embedding is closest above the threshold.
+        Only entries of the same namespace (model + exact system prompt) are considered.
+        """
+        if not vector:
+            return None
+        best_score, best_value = self.threshold, None
+        with self._lock:
+            for created, entry_namespace, value, entry_vector in self._entries.values():
+                if entry_namespace != namespace or not entry_vector or self._expired(created):
+                    continue
+                score = sum(a * b for a, b in zip(vector, entry_vector))
+                if score >= best_score:
+                    best_score, best_value = score, value
+        return best_value
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed texts with one Ollama /api/embed request, reusing memoized vectors."""
+        if not self.semantic:
+            return [None] * len(texts)
+        missing = self._missing(texts)
+        if missing:
+            self._remember(missing, self._client().embed_documents(missing))
+        return [self._vector(t) for t in texts]
+
+    async def aembed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if not self.semantic:
+            return [None] * len(texts)
+        missing = self._missing(texts)
+        if missing:
+            self._remember(missing, await self._client().aembed_documents(missing))
+        return [self._vector(t) for t in texts]
+
+    # --- Internals ---
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.monotonic() - created > self.ttl
+
+    def _client(self):
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            self._embeddings = OllamaEmbeddings(model=self.embed_model)
+        return self._embeddings
+
+    @staticmethod
+    def _text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _missing(self, texts: List[str]) -> List[str]:
+        with self._lock:
+            return list(dict.fromkeys(t for t in texts if self._text_key(t) not in self._vectors))
+
+    def _remember(self, texts: List[str], vectors: List[List[float]]):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+                self._vectors[self._text_key(text)] = [x / norm for x in vector]
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def _vector(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            return self._vectors.get(self._text_key(text))
+
+
+_shared_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide cache so hits survive across /generate requests."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = LLMCache.from_env()
+    return _shared_cache
@@ -0,0 +1,67 @@
+"""
+LLM Latency Metrics
+Per-agent TTFT / decode-rate / end-to-end counters, exposed in Prometheus text format.
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+class LLMMetrics:
+    """
+    Running totals of LLM calls per agent.
+
+    Each completed call adds its end-to-end time and Ollama's eval counters
+    (output tokens and decode time); streamed calls also add their time to
+    first token. TPOT is decode_seconds / output_tokens.
+    """
+
+    FIELDS = ("requests", "request_seconds", "ttft_seconds", "streamed",
+              "output_tokens", "decode_seconds", "prompt_tokens", "prefill_seconds")
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, request_seconds: float, ttft_seconds: Optional[float] = None,
+               response_metadata: Optional[dict] = None):
+        meta = response_metadata or {}
+        with self._lock:
+            totals = self._totals[agent]
+            totals["requests"] += 1
+            totals["request_seconds"] += request_seconds
+            if ttft_seconds is not None:
+                totals["streamed"] += 1
+                totals["ttft_seconds"] += ttft_seconds
+            # Ollama reports durations in nanoseconds
+            totals["output_tokens"] += meta.get("eval_count") or 0
+            totals["decode_seconds"] += (meta.get("eval_duration") or 0) / 1e9
+            totals["prompt_tokens"] += meta.get("prompt_eval_count") or 0
+            totals["prefill_seconds"] += (meta.get("prompt_eval_duration") or 0) / 1e9
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {agent: dict(totals) for agent, totals in self._totals.items()}
+
+    def render(self) -> str:
+        """Prometheus text exposition of the totals."""
+        snapshot = self.snapshot()
+        lines: List[str] = []
+        for field in self.FIELDS:
+            name = f"llm_{field}_total"
+            lines.append(f"# TYPE {name} counter")
+            for agent, totals in sorted(snapshot.items()):
+                lines.append(f'{name}{{agent="{agent}"}} {totals[field]:g}')
+        return "\n".join(lines) + "\n"
+
+
+_shared_metrics: Optional[LLMMetrics] = None
+
+
+def get_llm_metrics() -> LLMMetrics:
+    """Process-wide metrics so totals accumulate across /generate requests."""
+    global _shared_metrics
+    if _shared_metrics is None:
+        _shared_metrics = LLMMetrics()
+    return _shared_metrics
@@ -0,0 +1,46 @@
+"""
+Prompt Budgets
+Token-bounded excerpts of earlier agents' outputs for later prompts.
+"""
+
+import functools
+
+try:
+    import tiktoken
+except ImportError:  # budgets fall back to a chars-per-token estimate
+    tiktoken = None
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # BPE file is downloaded on first use; unavailable offline
+        return None
+
+
+def warm_encoding():
+    """Load the tokenizer now.
+    
+    The first load may download tiktoken's BPE file, without a timeout. The
+    server runs this in a worker thread during startup, so tok_head never
+    blocks the event loop and cuts every excerpt the same way for the whole
+    process (a later switch from the estimate would change cached prompts).
+    """
+    _encoding()
+
+
+@functools.lru_cache(maxsize=256)
+def tok_head(text: str, n: int) -> str:
+    """First n tokens of text, cut on a token (or, without tiktoken, word) boundary"""
+    enc = _encoding()
+    if enc is None:
+        limit = n * 4
+        if len(text) <= limit:
+            return text
+        cut = text.rfind(" ", 0, limit)
+        return text[:cut if cut > 0 else limit]
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= n else enc.decode(ids[:n])
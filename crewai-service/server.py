@@ -1,18 +1,36 @@
 
 import os
-import re
+import sys
+import json
+import time
+import logging
+import queue
 import asyncio
-from fastapi import FastAPI, WebSocket, HTTPException, Request
+import contextlib
+import functools
+import inspect
+import itertools
+import importlib.util
+import platform
+import httpx
+from fastapi import FastAPI, WebSocket, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
-from typing import List, Dict, Any, Optional
-from langchain_community.chat_models import ChatOllama
+from typing import Dict, Any, Optional
+from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import StateGraph, START, END
+
+try:
+    import orjson
+except ImportError:  # optional speed-up for broadcast/result serialization
+    orjson = None
 
 # Import our agent definitions
 from agents import (
+    ProjectState,
     ProductManagerState,
     ProductManagerAgent,
     SoftwareArchitectState,
@@ -24,10 +42,95 @@ from agents import (
     QAEngineerState,
     QAEngineerAgent,
     CodeReviewerState,
-    CodeReviewerAgent
+    CodeReviewerAgent,
+    TechnicalWriterAgent,
+    flush_callbacks
 )
+from llm_metrics import get_llm_metrics
+from prompt_budget import warm_encoding
+
+# Per-event console echo of agent logs is DEBUG; the WebSocket stream is the UI
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+
+async def _warm_model(model: str):
+    """Load the model in Ollama and open the pooled connection before the first /generate."""
+    try:
+        await get_llm(model).model_copy(update={"num_predict": 1}).ainvoke("ok")
+        logger.info("Model %s loaded", model)
+    except Exception as e:
+        logger.warning("Could not preload %s: %s", model, e)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _redis
+    # In the background, so the service accepts connections while Ollama loads
+    warm = asyncio.create_task(_warm_model(os.getenv("DEFAULT_MODEL", "llama3")))
+    # Before serving: prompt excerpts must be cut by one tokenizer all along
+    await asyncio.to_thread(warm_encoding)
+    relay = None
+    if REDIS_URL:
+        import redis.asyncio as aioredis
+        _redis = aioredis.from_url(REDIS_URL)
+        pubsub = _redis.pubsub()
+        await pubsub.subscribe(REDIS_CHANNEL)
+        relay = asyncio.create_task(_relay_redis(pubsub))
+    yield
+    warm.cancel()
+    if relay is not None:
+        relay.cancel()
+        await pubsub.aclose()
+        await _redis.aclose()
+        _redis = None
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Upper bound on concurrent requests to Ollama; keep in sync with the
+# OLLAMA_NUM_PARALLEL setting of the Ollama server.
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+
+# Keep the model (and its prompt KV cache) resident between requests
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Context window; unset uses Ollama's default. The developer's system prompt
+# carries requirements + architecture, which can outgrow a small window.
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0")) or None
+
+# Concurrent /generate runs. Sync agent nodes run on the loop's default thread
+# pool, so unbounded runs would starve file writes and other offloaded work.
+GEN_WORKERS = int(os.getenv("GEN_WORKERS", "2"))
+_generation_slots = asyncio.Semaphore(GEN_WORKERS)
+# Requests allowed to wait for a slot; beyond that /generate answers 503
+GEN_QUEUE_SIZE = int(os.getenv("GEN_QUEUE_SIZE", "8"))
+_generation_waiting = 0
+
+
+@functools.lru_cache(maxsize=8)
+def get_llm(model: str) -> ChatOllama:
+    """One ChatOllama per model, so keep-alive connections survive across /generate calls.
+    
+    Its async client binds to the server's event loop on first use, which is
+    safe because every generation runs on that loop. The sync client serves
+    the planning agents from worker threads (httpx.Client is thread-safe).
+    """
+    # Idle connections outlive the QA runs between calls (httpx defaults to 5s)
+    limits = httpx.Limits(
+        max_connections=OLLAMA_NUM_PARALLEL,
+        max_keepalive_connections=OLLAMA_NUM_PARALLEL,
+        keepalive_expiry=300
+    )
+    return ChatOllama(
+        model=model,
+        temperature=0.7,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        num_ctx=OLLAMA_NUM_CTX,
+        sync_client_kwargs={"limits": limits},
+        async_client_kwargs={"limits": limits}
+    )
 
 # CORS
 app.add_middleware(
@@ -38,34 +141,87 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# WebSockets for finding active clients
-active_connections: List[WebSocket] = []
+# WebSockets for finding active clients, each with its outbox of pending events
+active_connections: Dict[WebSocket, asyncio.Queue] = {}
+
+# Events are coalesced into one frame per window; streamed code is one event per token
+BATCH_WINDOW = 0.02
+MAX_BATCH = 256
+# Pending events per client; a stalled client loses its oldest events, not our memory
+OUTBOX_SIZE = 4096
+
+# Optional cross-worker fan-out: with REDIS_URL set, events are published to
+# Redis and every worker relays them to its own clients
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_CHANNEL = "agent-events"
+_redis = None
+
+
+def _dumps(data: Any, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    return json.dumps(data, indent=2 if indent else None, ensure_ascii=False, separators=None if indent else (",", ":"))
+
+
+async def _send_batches(websocket: WebSocket, outbox: asyncio.Queue):
+    """Flush a client's outbox of pre-serialized events as {"type": "batch", "events": [...]} frames."""
+    while True:
+        events = [await outbox.get()]
+        await asyncio.sleep(BATCH_WINDOW)
+        while len(events) < MAX_BATCH and not outbox.empty():
+            events.append(outbox.get_nowait())
+        try:
+            await websocket.send_text('{"type":"batch","events":[' + ",".join(events) + ']}')
+        except Exception:
+            active_connections.pop(websocket, None)
+            return
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.append(websocket)
+    outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+    active_connections[websocket] = outbox
+    sender = asyncio.create_task(_send_batches(websocket, outbox))
     try:
         while True:
             # Just keep connection open and listen for pings
             await websocket.receive_text()
     except Exception:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        pass
+    finally:
+        active_connections.pop(websocket, None)
+        sender.cancel()
+
+
+def _fanout(payload: str):
+    """Queue a serialized event for each of this worker's clients."""
+    for outbox in active_connections.values():
+        if outbox.full():
+            outbox.get_nowait()
+        outbox.put_nowait(payload)
+
+
+async def _relay_redis(pubsub):
+    """Forward events published by any worker to this worker's clients."""
+    async for message in pubsub.listen():
+        if message["type"] == "message":
+            _fanout(message["data"].decode("utf-8"))
 
 
 async def _broadcast(data: dict):
-    """Internal broadcast helper."""
-    to_remove = []
-    for connection in active_connections:
+    """Internal broadcast helper; queues the event for each client's sender and returns."""
+    if _redis is None and not active_connections:
+        return
+    # Serialized once; senders splice the shared string into their batch frames
+    payload = _dumps(data)
+    if _redis is not None:
         try:
-            await connection.send_json(data)
-        except:
-            to_remove.append(connection)
-    
-    for c in to_remove:
-        if c in active_connections:
-            active_connections.remove(c)
+            await _redis.publish(REDIS_CHANNEL, payload)
+            return
+        except Exception:
+            pass  # Redis unavailable: at least reach this worker's clients
+    _fanout(payload)
 
 
 async def broadcast_log(message: str):
@@ -98,51 +254,88 @@ async def broadcast_terminal(output: str, is_error: bool = False):
     await _broadcast({"type": "terminal", "output": output, "isError": is_error})
 
 
+def _write_file(path: str, content: str):
+    # Binary: one encode, no TextIOWrapper, and LF line endings on every OS
+    with open(path, "wb") as f:
+        f.write(content.encode("utf-8"))
+
+
+# Characters Windows rejects in file names
+_FILENAME_STRIP = str.maketrans('', '', '<>:"/\\|?*')
+
+
 class GenerateRequest(BaseModel):
     name: str
     description: str
     model: str = "llama3"
 
 
-def run_graph_generation(project_name: str, description: str, model: str, log_callback, update_callback):
-    """
-    Synchronous wrapper to run the LangGraph workflow.
-    Includes QA Engineer for testing and fixing.
-    """
-    log_callback(f"🚀 Initializing Autonomous Team with model: {model}")
-    
-    # Initialize LLM
-    llm = ChatOllama(model=model, temperature=0.7)
-    
-    # Define Agents
-    pm = ProductManagerAgent(llm, log_callback, update_callback)
-    architect = SoftwareArchitectAgent(llm, log_callback, update_callback)
-    tech_lead = TechLeadAgent(llm, log_callback, update_callback)
-    developer = DeveloperAgent(llm, log_callback, update_callback)
-    qa_engineer = QAEngineerAgent(llm, log_callback, update_callback)
-    
-    # Create LangGraph workflow
-    workflow = StateGraph(Dict[str, Any])
+# Graph node -> (agent class, method); agents are built per request with its callbacks
+_TEAM = {
+    "product_manager": (ProductManagerAgent, "analyze_requirements"),
+    "scaffold": (TechnicalWriterAgent, "scaffold_repo"),
+    "architect": (SoftwareArchitectAgent, "design_architecture"),
+    "tech_lead": (TechLeadAgent, "breakdown_tasks"),
+    "developer": (DeveloperAgent, "write_code"),
+    "qa_engineer": (QAEngineerAgent, "validate_and_test"),
+}
+
+
+def _team_node(name: str, agent_cls: type, method: str):
+    """Node that runs this request's agent, passed in as config["configurable"]["team"]"""
+    if inspect.iscoroutinefunction(getattr(agent_cls, method)):
+        async def node(state: ProjectState, config: RunnableConfig):
+            return await getattr(config["configurable"]["team"][name], method)(state)
+    else:
+        def node(state: ProjectState, config: RunnableConfig):
+            return getattr(config["configurable"]["team"][name], method)(state)
+    return node
+
+
+def _build_workflow():
+    """Compile the team's LangGraph workflow (once, at import)."""
+    workflow = StateGraph(ProjectState)
     
     # Add Nodes
-    workflow.add_node("product_manager", pm.analyze_requirements)
-    workflow.add_node("architect", architect.design_architecture)
-    workflow.add_node("tech_lead", tech_lead.breakdown_tasks)
-    workflow.add_node("developer", developer.write_code)
-    workflow.add_node("qa_engineer", qa_engineer.validate_and_test)
+    for name, (agent_cls, method) in _TEAM.items():
+        workflow.add_node(name, _team_node(name, agent_cls, method))
     
-    # Define Edges (sequential flow)
-    workflow.set_entry_point("product_manager")
-    workflow.add_edge("product_manager", "architect")
+    # Define Edges
+    # PM and repo scaffolding only need the description, so they run in
+    # parallel and join before the architect.
+    workflow.add_edge(START, "product_manager")
+    workflow.add_edge(START, "scaffold")
+    workflow.add_edge(["product_manager", "scaffold"], "architect")
     workflow.add_edge("architect", "tech_lead")
     workflow.add_edge("tech_lead", "developer")
     workflow.add_edge("developer", "qa_engineer")
     workflow.add_edge("qa_engineer", END)
     
-    # Compile
-    app_graph = workflow.compile()
+    return workflow.compile()
+
+
+_WORKFLOW = _build_workflow()
+
+
+async def run_graph_generation(project_name: str, description: str, model: str, log_callback, update_callback):
+    """
+    Runs the LangGraph workflow on the current event loop.
+    Synchronous agent nodes are offloaded to worker threads by LangGraph,
+    async nodes (e.g. the Developer's parallel file generation) run on the loop.
+    Includes QA Engineer for testing and fixing.
+    """
+    log_callback(f"🚀 Initializing Autonomous Team with model: {model}")
+    
+    # Shared LLM (the async client's pool bounds parallel generations)
+    llm = get_llm(model)
     
-    log_callback("✅ Team Assembled: PM → Architect → Tech Lead → Developer → QA Engineer")
+    # Define Agents
+    team = {
+        name: agent_cls(llm, log_callback, update_callback)
+        for name, (agent_cls, _) in _TEAM.items()
+    }
+    
+    log_callback("✅ Team Assembled: (PM ∥ Tech Writer) → Architect → Tech Lead → Developer → QA Engineer")
     log_callback("🏃 Starting Workflow...")
     
     # Execute Graph
@@ -152,13 +345,19 @@ def run_graph_generation(project_name: str, description: str, model: str, log_ca
         "requirements": "",
         "architecture": "",
         "tasks": [],
+        "scaffold_files": [],
         "code_files": [],
         "test_results": []
     }
     
     try:
-        # invoke() returns the final state
-        final_state = app_graph.invoke(initial_state)
+        # ainvoke() returns the final state
+        try:
+            final_state = await _WORKFLOW.ainvoke(initial_state, config={"configurable": {"team": team}})
+        finally:
+            # Agent logs are delivered from a queue; drain it before the
+            # completion (or error) message below
+            await asyncio.to_thread(flush_callbacks)
         
         update_callback("finalize", "Success", {})
         log_callback("🏁 Project Generation & Testing Completed Successfully!")
@@ -175,82 +374,134 @@ def run_graph_generation(project_name: str, description: str, model: str, log_ca
         raise e
 
 
-@app.get("/health")
-def health_check():
-    return {"status": "running", "service": "langgraph-agent-service"}
+# Serialized once; probes skip FastAPI's response encoding
+_HEALTH_BODY = _dumps({"status": "running", "service": "langgraph-agent-service"}).encode("utf-8")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """LLM latency counters per agent (Prometheus text format)."""
+    return Response(get_llm_metrics().render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health", include_in_schema=False)
+async def health_check():
+    # async: a sync handler would be dispatched to the thread pool on every probe
+    return Response(_HEALTH_BODY, media_type="application/json")
 
 
 @app.post("/generate")
 async def generate_project(request: GenerateRequest):
     """Generate a project using LangGraph agents with QA testing."""
+    global _generation_waiting
     # Sanitize filename for Windows
     raw_name = request.name
-    safe_name = re.sub(r'[<>:"/\\|?*]', '', raw_name)
-    safe_name = safe_name.strip().replace(' ', '-').lower()
+    safe_name = raw_name.translate(_FILENAME_STRIP).strip().replace(' ', '-').lower()
+    
+    # Wall clock, so ids stay unique across reboots (loop time is monotonic since boot)
+    project_id = f"{safe_name}-{int(time.time())}"
+    
+    # Agent threads only append to this queue; one task on the loop drains it
+    # every BATCH_WINDOW instead of each line waking the loop
+    events: "queue.SimpleQueue" = queue.SimpleQueue()
     
-    project_id = f"{safe_name}-{int(asyncio.get_event_loop().time())}"
+    async def drain_events():
+        # Broadcasts never suspend, so yield between chunks of a large backlog
+        # to let other requests and the client senders run
+        for drained in itertools.count(1):
+            try:
+                send, args = events.get_nowait()
+            except queue.Empty:
+                return
+            await send(*args)
+            if drained % MAX_BATCH == 0:
+                await asyncio.sleep(0)
     
-    loop = asyncio.get_running_loop()
+    async def pump_events():
+        while True:
+            await asyncio.sleep(BATCH_WINDOW)
+            await drain_events()
     
     # Thread-safe callbacks that bridge to the async loop
     def sync_log(message: str):
-        asyncio.run_coroutine_threadsafe(broadcast_log(message), loop)
+        # Streamed code tokens go only to the code panel; whitespace is significant
+        if message.startswith("📝 [Code] "):
+            file_path, _, chunk = message[len("📝 [Code] "):].partition(": ")
+            events.put((broadcast_code_chunk, (file_path, chunk)))
+            return
+        
+        events.put((broadcast_log, (message,)))
         
-        # Also broadcast thoughts, code chunks, and terminal output based on prefix
+        # Also broadcast thoughts and terminal output based on prefix
         if message.startswith("💭 [AI Thought]:"):
             thought = message.replace("💭 [AI Thought]:", "").strip()
-            asyncio.run_coroutine_threadsafe(broadcast_thought(thought), loop)
-        elif message.startswith("📝 [Code]"):
-            parts = message.split(":", 2)
-            if len(parts) >= 3:
-                file_path = parts[1].strip()
-                chunk = parts[2].strip()
-                asyncio.run_coroutine_threadsafe(broadcast_code_chunk(file_path, chunk), loop)
+            events.put((broadcast_thought, (thought,)))
         elif message.startswith("📟 [stdout]:") or message.startswith("❌ [stderr]:"):
             is_error = message.startswith("❌")
             output = message.split(":", 1)[1].strip() if ":" in message else message
-            asyncio.run_coroutine_threadsafe(broadcast_terminal(output, is_error), loop)
+            events.put((broadcast_terminal, (output, is_error)))
         
-        print(message)
+        logger.debug("%s", message)
     
     def sync_agent_update(agent_id: str, status: str, metrics: dict):
-        asyncio.run_coroutine_threadsafe(broadcast_agent_update(agent_id, status, metrics), loop)
-        print(f"[Agent] {agent_id}: {status}")
+        events.put((broadcast_agent_update, (agent_id, status, metrics)))
+        logger.debug("[Agent] %s: %s", agent_id, status)
+    
+    if _generation_slots.locked() and _generation_waiting >= GEN_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail="Too many queued generations, try again later")
     
     try:
         await broadcast_log(f"📦 Starting Autonomous Team for: {request.name}")
         
-        # Run the synchronous graph in a separate thread
-        result = await loop.run_in_executor(
-            None,
-            lambda: run_graph_generation(request.name, request.description, request.model, sync_log, sync_agent_update)
-        )
+        if _generation_slots.locked():
+            await broadcast_log("⏳ Waiting for a running generation to finish...")
+        _generation_waiting += 1
+        try:
+            await _generation_slots.acquire()
+        finally:
+            _generation_waiting -= 1
+        try:
+            pump = asyncio.create_task(pump_events())
+            try:
+                result = await run_graph_generation(request.name, request.description, request.model, sync_log, sync_agent_update)
+            finally:
+                # Deliver queued agent events before any completion/failure message
+                pump.cancel()
+                await drain_events()
+        finally:
+            _generation_slots.release()
         
         # Save to disk
         output_dir = os.path.join("..", "output", project_id)
         os.makedirs(output_dir, exist_ok=True)
         
-        files_to_return = []
-        for file_obj in result.get('files', []):
-            file_path = file_obj.get('path')
-            content = file_obj.get('content')
-            
-            if file_path and content:
-                full_path = os.path.join(output_dir, file_path)
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                with open(full_path, "w", encoding="utf-8") as f:
-                    f.write(content)
-                files_to_return.append({"path": file_path, "content": content})
+        files_to_return = [
+            {"path": file_obj.get('path'), "content": file_obj.get('content')}
+            for file_obj in result.get('files', [])
+            if file_obj.get('path') and file_obj.get('content')
+        ]
+        
+        # Create every directory once, then write the files concurrently off the loop
+        for directory in {os.path.dirname(os.path.join(output_dir, f["path"])) for f in files_to_return}:
+            os.makedirs(directory, exist_ok=True)
+        
+        await asyncio.gather(*(
+            asyncio.to_thread(_write_file, os.path.join(output_dir, f["path"]), f["content"])
+            for f in files_to_return
+        ))
         
         # Save test results summary
         test_results = result.get('test_results', [])
         if test_results:
             summary_path = os.path.join(output_dir, "test_results.json")
-            import json
-            with open(summary_path, "w", encoding="utf-8") as f:
-                json.dump(test_results, f, indent=2)
+            await asyncio.to_thread(_write_file, summary_path, _dumps(test_results, indent=True))
         
-        return {"project_id": project_id, "files": files_to_return, "test_results": test_results}
+        # Serialized once with _dumps: skips FastAPI's jsonable_encoder walk
+        # over every file's content
+        return Response(
+            _dumps({"project_id": project_id, "files": files_to_return, "test_results": test_results}),
+            media_type="application/json"
+        )
 
     except Exception as e:
         await broadcast_log(f"💥 Critical Failure: {str(e)}")
@@ -267,10 +518,37 @@ async def chat_endpoint(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _uring_loop_factory() -> asyncio.AbstractEventLoop:
+    import uringcore
+    return uringcore.EventLoopPolicy().new_event_loop()
+
+
+def _event_loop() -> str:
+    """uvicorn `loop`: io_uring via uringcore when installed on Linux 5.11+, else "auto"."""
+    if sys.platform != "linux" or importlib.util.find_spec("uringcore") is None:
+        return "auto"
+    # Loop import strings need uvicorn >= 0.36; older releases reject them at startup
+    if not hasattr(uvicorn.Config, "get_loop_factory"):
+        return "auto"
+    try:
+        kernel = tuple(int(part) for part in platform.release().split(".")[:2])
+    except ValueError:
+        return "auto"
+    return "server:_uring_loop_factory" if kernel >= (5, 11) else "auto"
+
+
 if __name__ == "__main__":
     import uvicorn
     
     port = int(os.getenv("PORT", 3002))
-    print(f"LangGraph Autonomous Service starting on port {port}")
+    # WebSocket clients live in-process, so without REDIS_URL a /generate
+    # handled by one worker only reaches sockets connected to that worker.
+    # Raise WORKERS (or the conventional WEB_CONCURRENCY) only with REDIS_URL
+    # set or behind sticky routing of /ws and /generate.
+    workers = int(os.getenv("WORKERS") or os.getenv("WEB_CONCURRENCY") or 1)
+    print(f"LangGraph Autonomous Service starting on port {port} ({workers} worker(s))")
     
-    uvicorn.run("server:app", host="0.0.0.0", port=port, reload=True)
+    # "auto" picks uvloop/httptools (uvicorn[standard]) where available, e.g. not on
+    # Windows, and the websockets protocol for /ws
+    uvicorn.run("server:app", host="0.0.0.0", port=port, workers=workers,
+                loop=_event_loop(), http="auto", ws="auto", reload=False)
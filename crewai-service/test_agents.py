@@ -1,6 +1,7 @@
 import os
 import sys
-from graph import SoftwareCompanyGraph
+from concurrent.futures import ThreadPoolExecutor
+from graph import SoftwareCompanyGraph, run_sync
 
 # Ensure we can run this
 sys.path.append(os.getcwd())
@@ -14,7 +15,7 @@ def test_pm_agent():
         "requirements": "",
         "logs": []
     }
-    result = graph._analyze_requirements(state)
+    result = run_sync(graph._analyze_requirements(state))
     print(f"Result Keys: {result.keys()}")
     print(f"Requirements Length: {len(result.get('requirements', ''))}")
     assert result.get("requirements") and len(result["requirements"]) > 10
@@ -23,41 +24,44 @@ def test_pm_agent():
 def test_architect_agent(state):
     print("\n--- Testing Architect ---")
     graph = SoftwareCompanyGraph()
-    result = graph._plan_architecture(state)
+    result = run_sync(graph._plan_architecture(state))
     print(f"Architecture Length: {len(result.get('architecture', ''))}")
     print(f"File Structure: {result.get('file_structure')}")
     assert result.get("architecture")
     assert result.get("file_structure")
-    return result
+    return {**state, **result}
 
 def test_ux_agent(state):
     print("\n--- Testing UX Designer ---")
     graph = SoftwareCompanyGraph()
-    result = graph._define_ux(state)
+    result = run_sync(graph._define_ux(state))
     print(f"Design System Length: {len(result.get('design_system', ''))}")
     assert result.get("design_system")
-    return result
+    return {**state, **result}
 
 def test_dev_agent(state):
     print("\n--- Testing Developer (Frontend) ---")
     graph = SoftwareCompanyGraph()
     # Mock a file to work on
-    state["file_structure"] = [{"path": "index.html", "description": "Main page", "owner": "frontend"}]
-    state["current_file_index"] = 0
-    state["generated_files"] = []
+    state["file"] = {"path": "index.html", "description": "Main page", "owner": "frontend"}
+    state["context"] = graph._project_context(state)
     
-    result = graph._frontend_coding(state)
-    print(f"Generated Files: {len(result['generated_files'])}")
-    if result['generated_files']:
-        print(f"Content Preview: {result['generated_files'][0]['content'][:50]}...")
-    assert result['generated_files']
-    return result
+    result = run_sync(graph._frontend_coding(state))
+    print(f"Code Length: {len(result.get('code', ''))}")
+    if result.get('code'):
+        print(f"Content Preview: {result['code'][:50]}...")
+    assert result.get('code')
+    return {**state, **result}
 
 if __name__ == "__main__":
     try:
         s1 = test_pm_agent()
-        s2 = test_architect_agent(s1)
-        s3 = test_ux_agent(s2)
+        # Architect and UX only need the requirements (as in the graph), so
+        # their LLM calls overlap
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            architect = pool.submit(test_architect_agent, s1)
+            ux = pool.submit(test_ux_agent, s1)
+            s3 = {**architect.result(), **ux.result()}
         s4 = test_dev_agent(s3)
         print("\n✅ ALL AGENTS PASSED BASIC CHECKS")
     except Exception as e:
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_ollama")
+
+from graph import _STACK_TEMPLATES, _classify_stack
+
+
+@pytest.mark.parametrize("description, stack", [
+    ("A React todo app", "react_spa"),
+    ("FastAPI CRUD API for books", "fastapi_crud"),
+    ("A Python CLI for notes", "python_cli"),
+    ("A CLI to rename photos", "python_cli"),
+    ("A portfolio landing page", "static_site"),
+    ("A page about my cat", "static_site"),
+])
+def test_templates_for_well_known_stacks(description, stack):
+    assert _classify_stack(description) == stack
+
+
+@pytest.mark.parametrize("description", [
+    "A React frontend with a FastAPI backend and PostgreSQL database",
+    "Full stack app: Express API with React UI and user login",
+    "A FastAPI backend with a database",
+    "A Rust CLI for resizing images",
+    "Node.js command-line todo tool",
+    "A portfolio with login",
+])
+def test_anything_beyond_a_template_goes_to_the_architect(description):
+    assert _classify_stack(description) is None
+
+
+def test_static_site_needs_a_static_prd_too():
+    assert _classify_stack("A page about my cat", "Users sign in through the backend") is None
+
+
+def test_templates_are_well_formed():
+    for architecture, files in _STACK_TEMPLATES.values():
+        assert architecture
+        paths = [f["path"] for f in files]
+        assert len(paths) == len(set(paths))
+        assert all(f["owner"] in ("frontend", "backend") and f["description"] for f in files)
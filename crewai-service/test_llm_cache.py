@@ -0,0 +1,122 @@
+import llm_cache
+from llm_cache import LLMCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Embedder:
+    """Stands in for OllamaEmbeddings; counts documents sent to /api/embed"""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[3.0, 4.0] for _ in texts]
+
+
+def test_get_returns_what_was_set():
+    cache = LLMCache()
+    cache.set("k", "ns", "value")
+    assert cache.get("k") == "value"
+    assert cache.get("missing") is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LLMCache(max_entries=2)
+    cache.set("a", "ns", "1")
+    cache.set("b", "ns", "2")
+    cache.get("a")  # b is now the oldest
+    cache.set("c", "ns", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = LLMCache(ttl=60)
+    cache.set("k", "ns", "value", [1.0, 0.0])
+    clock.now += 59
+    assert cache.get("k") == "value"
+    clock.now += 2
+    assert cache.search("ns", [1.0, 0.0]) is None
+    assert cache.get("k") is None
+
+
+def test_ttl_zero_never_expires(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = LLMCache(ttl=0)
+    cache.set("k", "ns", "value")
+    clock.now += 10 ** 9
+    assert cache.get("k") == "value"
+
+
+def test_search_respects_threshold():
+    cache = LLMCache(threshold=0.9)
+    cache.set("k", "ns", "value", [1.0, 0.0])
+    assert cache.search("ns", [0.95, 0.3122]) == "value"
+    assert cache.search("ns", [0.8, 0.6]) is None
+
+
+def test_search_picks_the_closest_match():
+    cache = LLMCache(threshold=0.5)
+    cache.set("far", "ns", "far", [0.6, 0.8])
+    cache.set("near", "ns", "near", [1.0, 0.0])
+    assert cache.search("ns", [0.99, 0.1411]) == "near"
+
+
+def test_search_only_looks_in_its_namespace():
+    cache = LLMCache()
+    cache.set("k", "model:a", "value", [1.0, 0.0])
+    assert cache.search("model:b", [1.0, 0.0]) is None
+    assert cache.search("model:a", [1.0, 0.0]) == "value"
+
+
+def test_search_without_vector_is_a_miss():
+    cache = LLMCache()
+    cache.set("k", "ns", "value", [1.0, 0.0])
+    assert cache.search("ns", None) is None
+
+
+def test_namespace_pins_model_and_system_prompt():
+    assert LLMCache.namespace("m", "prompt") == LLMCache.namespace("m", "prompt")
+    assert LLMCache.namespace("m", "prompt") != LLMCache.namespace("m", "prompt!")
+    assert LLMCache.namespace("m", "prompt") != LLMCache.namespace("n", "prompt")
+
+
+def test_cache_key_includes_options_only_when_given():
+    messages = [{"role": "user", "content": "hi"}]
+    assert LLMCache.cache_key("m", messages) == LLMCache.cache_key("m", messages, None)
+    assert LLMCache.cache_key("m", messages) != LLMCache.cache_key("m", messages, {"temperature": 0.7})
+
+
+def test_sampled_llms_are_only_cached_when_enabled():
+    class Llm:
+        def __init__(self, temperature):
+            self.temperature = temperature
+
+    assert LLMCache().active_for(Llm(0))
+    assert not LLMCache().active_for(Llm(0.7))
+    assert LLMCache(enabled=True).active_for(Llm(0.7))
+
+
+def test_embed_without_model_returns_no_vectors():
+    assert LLMCache().embed(["a", "b"]) == [None, None]
+
+
+def test_embed_normalizes_and_memoizes():
+    cache = LLMCache(embed_model="test-embed")
+    embedder = cache._embeddings = _Embedder()
+    assert cache.embed(["a", "a", "b"]) == [[0.6, 0.8]] * 3
+    assert cache.embed(["a"]) == [[0.6, 0.8]]
+    # Duplicates and memoized texts are not sent again
+    assert embedder.calls == [["a", "b"]]
@@ -0,0 +1,36 @@
+import pytest
+
+import prompt_budget
+from prompt_budget import tok_head
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """tok_head without tiktoken: 4 characters per token"""
+    monkeypatch.setattr(prompt_budget, "_encoding", lambda: None)
+    tok_head.cache_clear()
+    yield
+    tok_head.cache_clear()
+
+
+def test_short_text_is_unchanged(estimate):
+    assert tok_head("short text", 10) == "short text"
+
+
+def test_estimate_cuts_on_a_word_boundary(estimate):
+    assert tok_head("alpha beta gamma delta", 3) == "alpha beta"
+
+
+def test_estimate_cuts_unbroken_text_at_the_limit(estimate):
+    assert tok_head("x" * 100, 5) == "x" * 20
+
+
+def test_tiktoken_cut_is_a_prefix_within_budget():
+    pytest.importorskip("tiktoken")
+    enc = prompt_budget._encoding()
+    if enc is None:
+        pytest.skip("cl100k_base is not available offline")
+    text = "The quick brown fox jumps over the lazy dog. " * 50
+    head = tok_head(text, 20)
+    assert text.startswith(head)
+    assert len(enc.encode(head)) <= 20
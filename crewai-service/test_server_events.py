@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_ollama")
+
+import server
+
+
+class _Socket:
+    def __init__(self, fail: bool = False):
+        self.frames = []
+        self.fail = fail
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise RuntimeError("connection closed")
+        self.frames.append(text)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    monkeypatch.setattr(server, "active_connections", {})
+    return server.active_connections
+
+
+def test_fanout_drops_the_oldest_event_when_full(connections):
+    async def run():
+        outbox = asyncio.Queue(maxsize=2)
+        connections[_Socket()] = outbox
+        for event in ("1", "2", "3"):
+            server._fanout(event)
+        return [outbox.get_nowait() for _ in range(outbox.qsize())]
+    assert asyncio.run(run()) == ["2", "3"]
+
+
+def test_events_are_sent_as_one_batch_frame(connections):
+    async def run():
+        websocket, outbox = _Socket(), asyncio.Queue()
+        connections[websocket] = outbox
+        for event in ({"type": "log", "message": "a"}, {"type": "log", "message": "b"}):
+            outbox.put_nowait(json.dumps(event))
+        sender = asyncio.create_task(server._send_batches(websocket, outbox))
+        await asyncio.sleep(server.BATCH_WINDOW * 3)
+        sender.cancel()
+        return websocket.frames
+    frames = asyncio.run(run())
+    assert len(frames) == 1
+    assert json.loads(frames[0]) == {"type": "batch", "events": [
+        {"type": "log", "message": "a"}, {"type": "log", "message": "b"}]}
+
+
+def test_batches_are_capped(connections, monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH", 2)
+    async def run():
+        websocket, outbox = _Socket(), asyncio.Queue()
+        for i in range(5):
+            outbox.put_nowait(json.dumps(i))
+        sender = asyncio.create_task(server._send_batches(websocket, outbox))
+        await asyncio.sleep(server.BATCH_WINDOW * 10)
+        sender.cancel()
+        return [json.loads(f)["events"] for f in websocket.frames]
+    assert asyncio.run(run()) == [[0, 1], [2, 3], [4]]
+
+
+def test_failed_send_drops_the_client(connections):
+    async def run():
+        websocket, outbox = _Socket(fail=True), asyncio.Queue()
+        connections[websocket] = outbox
+        outbox.put_nowait("{}")
+        await server._send_batches(websocket, outbox)
+    asyncio.run(run())
+    assert connections == {}
@@ -1,6 +1,6 @@
 'use client'
 
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { AgentFlowViewer } from '@/components/AgentFlowViewer'
 import { LiveWorkspace } from '@/components/LiveWorkspace'
 import { LogStream } from '@/components/LogStream'
@@ -26,12 +26,6 @@ interface Model {
   displayName?: string
 }
 
-interface CodeChunk {
-  file: string
-  content: string
-  timestamp: number
-}
-
 interface TerminalLine {
   output: string
   isError: boolean
@@ -62,7 +56,9 @@ export default function Home() {
   const [currentProjectId, setCurrentProjectId] = useState<string | null>(null)
 
   // NEW: Live UI State
-  const [codeChunks, setCodeChunks] = useState<CodeChunk[]>([])
+  // Streamed code so far, per file path
+  const [codeByFile, setCodeByFile] = useState<Record<string, string>>({})
+  const startedFiles = useRef<Set<string>>(new Set())
   const [terminalLines, setTerminalLines] = useState<TerminalLine[]>([])
   const [currentThought, setCurrentThought] = useState<string | null>(null)
   const [currentFile, setCurrentFile] = useState<string | null>(null)
@@ -106,36 +102,41 @@ export default function Home() {
         addLog('System', 'Connected to Autonomous Brain')
       }
 
+      const handleEvent = (data: any) => {
+        if (data.type === 'log') {
+          addLog('Agent', data.message)
+          setLatestLog(data.message)
+          parseAgentActivity(data.message)
+        } else if (data.type === 'agent_update') {
+          setLatestUpdate(data)
+          updateActiveAgentFromStatus(data)
+        } else if (data.type === 'thought') {
+          // NEW: Handle AI thought
+          setCurrentThought(data.content)
+        } else if (data.type === 'code_chunk') {
+          // NEW: Handle code chunk
+          setCodeByFile(prev => ({ ...prev, [data.file]: (prev[data.file] ?? '') + data.chunk }))
+          // Files stream concurrently; follow a file only when it starts
+          if (!startedFiles.current.has(data.file)) {
+            startedFiles.current.add(data.file)
+            setCurrentFile(data.file)
+          }
+        } else if (data.type === 'terminal') {
+          // NEW: Handle terminal output
+          setTerminalLines(prev => [...prev, {
+            output: data.output,
+            isError: data.isError || false,
+            timestamp: Date.now()
+          }])
+        }
+      }
+
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data)
-
-          if (data.type === 'log') {
-            addLog('Agent', data.message)
-            setLatestLog(data.message)
-            parseAgentActivity(data.message)
-          } else if (data.type === 'agent_update') {
-            setLatestUpdate(data)
-            updateActiveAgentFromStatus(data)
-          } else if (data.type === 'thought') {
-            // NEW: Handle AI thought
-            setCurrentThought(data.content)
-          } else if (data.type === 'code_chunk') {
-            // NEW: Handle code chunk
-            setCodeChunks(prev => [...prev, {
-              file: data.file,
-              content: data.chunk,
-              timestamp: Date.now()
-            }])
-            setCurrentFile(data.file)
-          } else if (data.type === 'terminal') {
-            // NEW: Handle terminal output
-            setTerminalLines(prev => [...prev, {
-              output: data.output,
-              isError: data.isError || false,
-              timestamp: Date.now()
-            }])
-          }
+          // The server coalesces events into batches to cut per-frame overhead
+          const events = data.type === 'batch' ? data.events : [data]
+          events.forEach(handleEvent)
         } catch (e) {
           console.error('Parse error', e)
         }
@@ -187,7 +188,8 @@ export default function Home() {
       const file = metrics?.file || 'code'
       const role = agent === 'frontend_dev' ? 'Frontend' : 'Backend'
       setActiveAgent({ name: 'Dev', role: role, status: 'Coding', task: `Writing ${file}`, file: file })
-      setCurrentFile(file)
+      // Completion updates carry no file; keep showing the current one
+      if (metrics?.file) setCurrentFile(metrics.file)
     } else if (agent === 'qa_engineer') {
       const file = metrics?.file || ''
       setActiveAgent({ name: 'QA', role: 'QA Engineer', status: 'Testing', task: `Testing ${file || 'code'}`, file: file })
@@ -207,7 +209,8 @@ export default function Home() {
     setIsRunning(true)
     setViewingProject(null)
     setLogs([])
-    setCodeChunks([])
+    setCodeByFile({})
+    startedFiles.current.clear()
     setTerminalLines([])
     setCurrentThought(null)
     setCurrentFile(null)
@@ -262,7 +265,8 @@ export default function Home() {
     try {
       await fetch('http://localhost:3001/api/reset', { method: 'POST' });
       setLogs([]);
-      setCodeChunks([]);
+      setCodeByFile({});
+      startedFiles.current.clear();
       setTerminalLines([]);
       setCurrentThought(null);
       setIsRunning(false);
@@ -460,8 +464,9 @@ export default function Home() {
                   <div className="h-full grid grid-cols-2 gap-4">
                     {/* Left: Live Code */}
                     <LiveCodePanel
-                      codeChunks={codeChunks}
+                      codeByFile={codeByFile}
                       currentFile={currentFile || undefined}
+                      onSelectFile={setCurrentFile}
                     />
 
                     {/* Right: Terminal */}
@@ -1,42 +1,31 @@
 'use client'
 
-import { useEffect, useRef, useState } from 'react'
+import { useEffect, useMemo, useRef } from 'react'
 import { Code, FileCode } from 'lucide-react'
 
-interface CodeChunk {
-    file: string
-    content: string
-    timestamp: number
-}
-
 interface LiveCodePanelProps {
-    codeChunks: CodeChunk[]
+    codeByFile: Record<string, string>
     currentFile?: string
+    onSelectFile?: (file: string) => void
 }
 
-export function LiveCodePanel({ codeChunks, currentFile }: LiveCodePanelProps) {
+export function LiveCodePanel({ codeByFile, currentFile, onSelectFile }: LiveCodePanelProps) {
     const bottomRef = useRef<HTMLDivElement>(null)
-    const [displayedContent, setDisplayedContent] = useState('')
 
-    // Get the latest code for the current file
-    const latestChunks = codeChunks.filter(c => c.file === currentFile)
-    const latestContent = latestChunks.length > 0
-        ? latestChunks[latestChunks.length - 1].content
-        : ''
+    const displayedContent = (currentFile && codeByFile[currentFile]) || ''
 
-    // Simulate typing effect
-    useEffect(() => {
-        if (latestContent !== displayedContent) {
-            setDisplayedContent(latestContent)
-        }
-    }, [latestContent])
+    // One text node for the gutter instead of an element per line
+    const lineNumbers = useMemo(() => {
+        const count = displayedContent.split('\n').length
+        return Array.from({ length: count }, (_, i) => i + 1).join('\n')
+    }, [displayedContent])
 
     useEffect(() => {
         bottomRef.current?.scrollIntoView({ behavior: 'smooth' })
     }, [displayedContent])
 
-    // Get unique files for tabs
-    const uniqueFiles = [...new Set(codeChunks.map(c => c.file))]
+    // Files in the order they started streaming
+    const uniqueFiles = useMemo(() => Object.keys(codeByFile), [codeByFile])
 
     return (
         <div className="h-full flex flex-col bg-[#1e1e1e] rounded-xl overflow-hidden border border-white/10">
@@ -52,8 +41,9 @@ export function LiveCodePanel({ codeChunks, currentFile }: LiveCodePanelProps) {
             {uniqueFiles.length > 0 && (
                 <div className="shrink-0 h-8 bg-[#2d2d2d] border-b border-black/30 flex items-center gap-1 px-2 overflow-x-auto">
                     {uniqueFiles.slice(-5).map((file, i) => (
-                        <div
+                        <button
                             key={i}
+                            onClick={() => onSelectFile?.(file)}
                             className={`px-3 py-1 text-[10px] rounded flex items-center gap-1.5 ${file === currentFile
                                     ? 'bg-[#1e1e1e] text-white'
                                     : 'text-gray-500 hover:text-gray-300'
@@ -61,14 +51,14 @@ export function LiveCodePanel({ codeChunks, currentFile }: LiveCodePanelProps) {
                         >
                             <FileCode className="w-3 h-3" />
                             {file.split('/').pop()}
-                        </div>
+                        </button>
                     ))}
                 </div>
             )}
 
             {/* Code Content */}
             <div className="flex-1 overflow-auto p-4 font-mono text-sm">
-                {!currentFile && codeChunks.length === 0 ? (
+                {!currentFile && uniqueFiles.length === 0 ? (
                     <div className="h-full flex items-center justify-center text-gray-600 text-sm">
                         <div className="text-center">
                             <Code className="w-12 h-12 mx-auto mb-3 opacity-30" />
@@ -78,10 +68,8 @@ export function LiveCodePanel({ codeChunks, currentFile }: LiveCodePanelProps) {
                 ) : (
                     <div className="relative">
                         {/* Line numbers */}
-                        <div className="absolute left-0 top-0 text-gray-600 select-none pr-4 text-right" style={{ width: '3rem' }}>
-                            {displayedContent.split('\n').map((_, i) => (
-                                <div key={i} className="leading-6">{i + 1}</div>
-                            ))}
+                        <div className="absolute left-0 top-0 text-gray-600 select-none pr-4 text-right leading-6 whitespace-pre" style={{ width: '3rem' }}>
+                            {lineNumbers}
                         </div>
 
                         {/* Code */}
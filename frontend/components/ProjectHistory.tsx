@@ -38,9 +38,18 @@ export function ProjectHistory({ onSelectProject }: ProjectHistoryProps) {
 
   useEffect(() => {
     loadHistory()
-    // Refresh every 5 seconds
-    const interval = setInterval(loadHistory, 5000)
-    return () => clearInterval(interval)
+    // Refresh every 5 seconds while the tab is visible; catch up when it returns
+    const interval = setInterval(() => {
+      if (!document.hidden) loadHistory()
+    }, 5000)
+    const onVisibilityChange = () => {
+      if (!document.hidden) loadHistory()
+    }
+    document.addEventListener('visibilitychange', onVisibilityChange)
+    return () => {
+      clearInterval(interval)
+      document.removeEventListener('visibilitychange', onVisibilityChange)
+    }
   }, [])
 
   const deleteProject = async (id: string, e: React.MouseEvent) => {